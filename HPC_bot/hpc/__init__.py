@@ -1,5 +1,7 @@
 from .cluster import Cluster
-from .connection import Connection
+from .connection import Connection, Compressions, TransferModes
 from .database import Database, DatabaseTypes
+from .executor import Executor
+from .placement import Placement
 from .runner import Runner
 from .storage import RemoteStorage
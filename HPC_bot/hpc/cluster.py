@@ -1,14 +1,21 @@
 import logging
 import os
-from typing import Dict, List, Optional, Tuple
-from pydantic import BaseModel, SecretStr, model_validator
+import re
+from queue import Queue
+from typing import Dict, List, Optional, Tuple, Union
+from pydantic import BaseModel, Field, SecretStr, model_validator
 from stat import S_ISDIR
 
-from .connection import Connection
+from .connection import Connection, Compressions, TransferModes, zstandard
+from .manifest import TransferManifest
 from .storage import RemoteStorage
 from .runner import Runner
 
 
+BATCH_MARKER = '#hpc_bot_batch'
+BATCH_MARKER_RE = re.compile(re.escape(BATCH_MARKER) + r' (\d+)')
+
+
 class Cluster(BaseModel):
     label: str
 
@@ -17,6 +24,16 @@ class Cluster(BaseModel):
 
     runners: List[Runner] = []
 
+    fetch_time: Optional[Union[int, Tuple[int, int]]] = None
+    sync_time: Optional[int] = Field(None, ge=1)
+    accounting: bool = True
+    array_packing: bool = False
+
+    transfer_mode: TransferModes = TransferModes.SFTP
+    compression: Compressions = Compressions.NONE
+    verify_checksums: bool = False
+    stream_uploads: bool = False
+
     associations: Dict[str, Runner] = {}
 
     @model_validator(mode='after')
@@ -31,6 +48,31 @@ class Cluster(BaseModel):
                 self.associations[association] = runner
         return self
 
+    @model_validator(mode='after')
+    def validate_compression(self) -> 'Cluster':
+        if (
+            self.compression == Compressions.ZSTD and
+            zstandard is None
+        ):
+            raise ValueError(
+                'zstd compression requires zstandard package '
+                '(pip install zstandard)'
+            )
+        return self
+
+    @model_validator(mode='after')
+    def validate_sync(self) -> 'Cluster':
+        # Tar streams have no per-file delta, every sync would copy
+        # the whole results of all running jobs again
+        if (
+            self.sync_time is not None and
+            self.transfer_mode == TransferModes.TAR
+        ):
+            raise ValueError(
+                'sync_time is not supported with tar transfer mode'
+            )
+        return self
+
     def get_runner_by_extension(self, ext: str) -> Optional[Runner]:
         return self.associations.get(ext)
 
@@ -45,6 +87,18 @@ class Cluster(BaseModel):
             return None, []
         return runner, args
 
+    def create_command(
+        self,
+        runner: Runner,
+        args: List[str] = None,
+        filename: str = None,
+        chdir: str = None
+    ) -> str:
+        return (
+            ('' if chdir is None else f"cd '{chdir}';") +
+            runner.create_command(args, filename)
+        )
+
     def start_runner(
         self,
         runner: Runner,
@@ -54,8 +108,7 @@ class Cluster(BaseModel):
     ) -> Tuple[str, str]:
 
         return self.connection.execute_by_ssh(
-            ('' if chdir is None else f"cd '{chdir}';") +
-            runner.create_command(args, filename)
+            self.create_command(runner, args, filename, chdir)
         )
 
     def perform_command(
@@ -76,6 +129,43 @@ class Cluster(BaseModel):
             chdir,
         )
 
+    def perform_commands(
+        self,
+        commands: List[Tuple[str, str, str]]
+    ) -> List[Optional[str]]:
+        # Runs (command, filename, chdir) items in one remote script.
+        # Each item prints a marker first, so the combined output can be
+        # split back; illegal commands get None
+        outputs = [None for _ in commands]
+        script = []
+        for i, (command, filename, chdir) in enumerate(commands):
+            runner, args = self.find_suitable_runner(command)
+            if runner is None:
+                continue
+
+            outputs[i] = ''
+            script.append(
+                f"echo '{BATCH_MARKER} {i}'; (" +
+                self.create_command(runner, args, filename, chdir) +
+                ') 2>&1'
+            )
+
+        if not script:
+            return outputs
+
+        stdout, stderr = self.connection.execute_by_ssh('\n'.join(script))
+        if stderr.strip():
+            logging.warning(f'Batch on {self.label} wrote to stderr: {stderr}')
+
+        current = None
+        for line in stdout.splitlines(keepends=True):
+            matched = BATCH_MARKER_RE.fullmatch(line.strip())
+            if matched is not None:
+                current = int(matched.group(1))
+            elif current is not None:
+                outputs[current] += line
+        return outputs
+
     def upload_file(
         self,
         local_path: str,
@@ -97,19 +187,61 @@ class Cluster(BaseModel):
 
         remote_path = f'{self.upload_path}/{rel_path}'
 
-        self.connection.put_by_sftp(local_path, remote_path)
+        if (
+            self.transfer_mode == TransferModes.TAR and
+            os.path.isdir(local_path)
+        ):
+            self.connection.put_by_tar(
+                local_path, remote_path, self.compression)
+        else:
+            self.connection.put_by_sftp(local_path, remote_path)
         return remote_path
 
+    def upload_stream(self, chunks: Queue, rel_path: str) -> str:
+        remote_path = f'{self.upload_path}/{rel_path}'
+        self.connection.put_stream_by_sftp(chunks, remote_path)
+        return remote_path
+
+    def get(self, remote_path: str, local_path: str):
+        if self.transfer_mode == TransferModes.TAR:
+            self.connection.get_by_tar(
+                remote_path, local_path, self.compression)
+        else:
+            self.connection.get_by_sftp(remote_path, local_path)
+
+    def get_resumable(
+        self,
+        remote_path: str,
+        local_path: str,
+        verify: bool = True
+    ):
+        if self.transfer_mode == TransferModes.TAR:
+            self.get(remote_path, local_path)
+            return
+
+        name = os.path.basename(remote_path)
+        manifest_path = TransferManifest.get_path(local_path, name)
+        manifest = TransferManifest.load(manifest_path)
+        try:
+            self.connection.get_by_sftp(
+                remote_path, local_path, manifest=manifest)
+            if verify and self.verify_checksums:
+                self.connection.verify_by_sha256(
+                    remote_path, os.path.join(local_path, name), manifest)
+        finally:
+            manifest.save(manifest_path)
+
     def download_file(self, remote_path: str, local_path: str) -> str:
         remote_path = f'{self.upload_path}/{remote_path}'
 
-        self.connection.get_by_sftp(remote_path, local_path)
+        self.get(remote_path, local_path)
         return local_path
 
     def download_dirs(
             self,
             remotes: List[str],
-            locals: List[str]
+            locals: List[str],
+            verify: bool = True
     ) -> List[bool]:
 
         success = [False for _ in zip(remotes, locals)]
@@ -117,7 +249,7 @@ class Cluster(BaseModel):
 
         for i, (r, l) in enumerate(zip(remotes, locals)):
             try:
-                self.connection.get_by_sftp(r, l)
+                self.get_resumable(r, l, verify)
                 success[i] = True
             except Exception as e:
                 logging.error(
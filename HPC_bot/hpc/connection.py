@@ -1,10 +1,19 @@
 import os
 import re
+import shlex
+import tarfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from enum import Enum
+from queue import Queue
+from random import uniform
 from stat import S_ISDIR
-from typing import Dict, Optional, Tuple
+from threading import BoundedSemaphore, RLock
+from typing import BinaryIO, Dict, Iterator, List, Optional, Set, Tuple
 from xml.etree import ElementTree
-from pydantic import BaseModel, Field, SecretStr
-from paramiko import SSHClient, AutoAddPolicy
+from pydantic import BaseModel, Field, PrivateAttr, SecretStr
+from paramiko import SSHClient, SFTPAttributes, AutoAddPolicy
 from paramiko.ssh_exception import SSHException
 from webdav3.client import Client as WebdavClient
 from pysftp import Connection as SFTPClient
@@ -12,6 +21,13 @@ import logging
 import requests
 from requests.auth import HTTPBasicAuth
 
+from .manifest import FileState, TransferManifest, get_sha256
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 # TODO: move this to config
 EXTENSIONS_WHITELIST = [".out", ".log", ".gjf", ".inp", ".err", ".fchk", ".xyz", ".cpcm", ".engrad", ".opt", ".hess", ".gbw"]
 FILES_WHITELIST = ['hessian', 'vibspectrum']
@@ -19,6 +35,36 @@ FILES_WHITELIST = ['hessian', 'vibspectrum']
 
 FILTERED_EXT = [re.compile(s) for s in [r'\.tmp', r'\.tmp\..*']]
 
+TAR_CHUNK_SIZE = 1024 * 1024
+PART_SUFFIX = '.part'
+CHECKSUM_BATCH = 100
+STREAM_TIMEOUT = 60
+
+
+class TransferModes(Enum):
+    SFTP = 'sftp'
+    TAR = 'tar'
+
+
+class Compressions(Enum):
+    NONE = 'none'
+    GZIP = 'gzip'
+    ZSTD = 'zstd'
+
+
+def is_whitelisted(filename: str) -> bool:
+    basename, ext = os.path.splitext(os.path.basename(filename))
+    return basename in FILES_WHITELIST or ext in EXTENSIONS_WHITELIST
+
+
+def find_whitelisted_command(path: str) -> str:
+    patterns = [f'*{ext}' for ext in EXTENSIONS_WHITELIST]
+    for name in FILES_WHITELIST:
+        patterns.extend([name, f'{name}.*'])
+
+    conditions = ' -o '.join(f'-name {shlex.quote(p)}' for p in patterns)
+    return f'find {shlex.quote(path)} -type f \\( {conditions} \\) -print0'
+
 
 class Connection(BaseModel):
     class Config:
@@ -32,16 +78,31 @@ class Connection(BaseModel):
     password: Optional[SecretStr] = None
     key_path: Optional[str] = None
 
+    keepalive: int = Field(30, ge=0)
+    max_channels: int = Field(4, ge=1)
+    max_sftp: int = Field(2, ge=1)
+    reconnect_attempts: int = Field(3, ge=1)
+    reconnect_delay: Tuple[float, float] = (1, 30)
+
+    large_file_size: int = Field(64 * 1024 * 1024, ge=1)
+    chunk_size: int = Field(8 * 1024 * 1024, ge=1)
+
     ssh_client: Optional[SSHClient] = None
-    sftp_client: Optional[SFTPClient] = None
     webdav_client: Optional[WebdavClient] = None
 
-    def open_ssh(self) -> SSHClient:
-        if self.ssh_client is not None:
-            self.ssh_client.close()
+    _ssh_lock: RLock = PrivateAttr(default_factory=RLock)
+    _channels: Optional[BoundedSemaphore] = PrivateAttr(None)
+    _sftp_slots: Optional[BoundedSemaphore] = PrivateAttr(None)
+    _sftp_idle: List[SFTPClient] = PrivateAttr(default_factory=list)
+    _known_dirs: Set[str] = PrivateAttr(default_factory=set)
+
+    def model_post_init(self, __context):
+        self._channels = BoundedSemaphore(self.max_channels)
+        self._sftp_slots = BoundedSemaphore(self.max_sftp)
 
-        self.ssh_client = SSHClient()
-        self.ssh_client.set_missing_host_key_policy(AutoAddPolicy())
+    def connect_ssh(self) -> SSHClient:
+        ssh_client = SSHClient()
+        ssh_client.set_missing_host_key_policy(AutoAddPolicy())
 
         if self.key_path:
             password = None
@@ -50,30 +111,44 @@ class Connection(BaseModel):
             password = self.password.get_secret_value()
             key = None
 
-        try:
-            self.ssh_client.connect(
-                hostname=self.host,
-                port=self.port,
-                username=self.user,
-                password=password,
-                key_filename=key,
-            )
-        except (SSHException, TimeoutError) as e:
-            logging.error('Connection error for {user}@{host}'.format(
-                user=self.user,
-                host=self.host
-            ), exc_info=e, stack_info=True)
-            raise ConnectionError('Failed to connect to server')
+        ssh_client.connect(
+            hostname=self.host,
+            port=self.port,
+            username=self.user,
+            password=password,
+            key_filename=key,
+        )
+        if self.keepalive > 0:
+            ssh_client.get_transport().set_keepalive(self.keepalive)
 
-        return self.ssh_client
+        return ssh_client
 
-    def open_sftp(self) -> SFTPClient:
-        if self.sftp_client is not None:
-            self.sftp_client.close()
+    def open_ssh(self) -> SSHClient:
+        with self._ssh_lock:
+            self.close_sftp_sessions()
+            self._known_dirs = set()
+            if self.ssh_client is not None:
+                self.ssh_client.close()
+                self.ssh_client = None
+
+            base, limit = self.reconnect_delay
+            for attempt in range(self.reconnect_attempts):
+                try:
+                    self.ssh_client = self.connect_ssh()
+                    return self.ssh_client
+                except (SSHException, OSError) as e:
+                    logging.error(
+                        'Connection error for {user}@{host} '
+                        '(attempt {attempt})'.format(
+                            user=self.user,
+                            host=self.host,
+                            attempt=attempt + 1
+                        ), exc_info=e)
+
+                if attempt + 1 < self.reconnect_attempts:
+                    time.sleep(uniform(0, min(base * 2 ** attempt, limit)))
 
-        ssh = self.get_ssh_client()
-        self.sftp_client = ssh.open_sftp()
-        return self.sftp_client
+            raise ConnectionError('Failed to connect to server')
 
     def open_webdav(self) -> WebdavClient:
         if self.key_path:
@@ -101,33 +176,104 @@ class Connection(BaseModel):
         return (transport is not None) and transport.is_alive()
 
     def get_ssh_client(self) -> SSHClient:
-        if self.is_ssh_active():
-            return self.ssh_client
-        return self.open_ssh()
-
-    def get_sftp_client(self) -> SFTPClient:
-        if self.sftp_client is None or not self.is_ssh_active():
-            return self.open_sftp()
-        return self.sftp_client
+        with self._ssh_lock:
+            if self.is_ssh_active():
+                return self.ssh_client
+            return self.open_ssh()
+
+    def close_sftp_sessions(self):
+        with self._ssh_lock:
+            idle, self._sftp_idle = self._sftp_idle, []
+
+        for sftp in idle:
+            try:
+                sftp.close()
+            except Exception:
+                pass
+
+    @contextmanager
+    def sftp_session(self) -> Iterator[SFTPClient]:
+        with self._sftp_slots:
+            ssh = self.get_ssh_client()
+            with self._ssh_lock:
+                sftp = self._sftp_idle.pop() if self._sftp_idle else None
+            if sftp is None:
+                sftp = ssh.open_sftp()
+
+            try:
+                yield sftp
+            except Exception:
+                sftp.close()
+                raise
+
+            with self._ssh_lock:
+                if self.ssh_client is ssh and self.is_ssh_active():
+                    self._sftp_idle.append(sftp)
+                    sftp = None
+            if sftp is not None:
+                sftp.close()
 
     def get_webdav_client(self) -> WebdavClient:
         if self.webdav_client is None:
             return self.open_webdav()
         return self.webdav_client
 
-    def execute_by_ssh(self, command: str) -> Tuple[str, str]:
-        ssh = self.get_ssh_client()
+    def exec_command(self, command: str):
+        try:
+            return self.get_ssh_client().exec_command(command)
+        except SSHException as e:
+            if not self.is_ssh_active():
+                # Reconnected once under the lock for all lanes
+                return self.get_ssh_client().exec_command(command)
+
+            # A channel is refused on a live transport, e.g. MaxSessions
+            # of the server is reached. The transport carries commands and
+            # transfers of other lanes, so it is kept and the channel is
+            # requested again
+            logging.warning(
+                f'Failed to open channel to {self.user}@{self.host}:'
+                f'{self.port}, retrying: {e}'
+            )
+            time.sleep(uniform(0, self.reconnect_delay[0]))
+            return self.get_ssh_client().exec_command(command)
 
-        stdin, stdout, stderr = ssh.exec_command(command)
-        logging.debug(f'Executed command {command} at '
-                     f'{self.user}@{self.host}:{self.port}')
-        stdin.close()
+    def execute_by_ssh(self, command: str) -> Tuple[str, str]:
+        with self._channels:
+            stdin, stdout, stderr = self.exec_command(command)
+            logging.debug(f'Executed command {command} at '
+                          f'{self.user}@{self.host}:{self.port}')
+            stdin.close()
 
-        return ''.join(stdout.readlines()), ''.join(stderr.readlines())
+            return ''.join(stdout.readlines()), ''.join(stderr.readlines())
 
-    def get_by_sftp(self, remote_path: str, local_path: str, recurse=True):
-        sftp = self.get_sftp_client()
+    def get_by_sftp(
+        self,
+        remote_path: str,
+        local_path: str,
+        recurse=True,
+        manifest: TransferManifest = None
+    ):
+        with self.sftp_session() as sftp:
+            large_files = self._get_by_sftp(
+                sftp, remote_path, local_path, recurse, manifest)
+
+        for path, local, attr, key in large_files:
+            self.get_large_by_sftp(path, local, attr.st_size)
+            if manifest is not None:
+                manifest.files[key] = FileState(
+                    size=attr.st_size,
+                    mtime=int(attr.st_mtime),
+                    complete=True
+                )
 
+    def _get_by_sftp(
+        self,
+        sftp: SFTPClient,
+        remote_path: str,
+        local_path: str,
+        recurse=True,
+        manifest: TransferManifest = None
+    ) -> List[Tuple[str, str, SFTPAttributes, str]]:
         logging.debug(f'sftp get from {remote_path} to {local_path}')
 
         if os.path.isdir(local_path):
@@ -136,39 +282,185 @@ class Connection(BaseModel):
                 os.path.basename(remote_path)
             )
 
-        if not recurse or not self.is_dir_sftp(remote_path):
-            sftp.get(remotepath=remote_path, localpath=local_path)
-            return
+        if not recurse or not self.is_dir_sftp(remote_path, sftp):
+            if manifest is None:
+                sftp.get(remotepath=remote_path, localpath=local_path)
+            else:
+                self._get_file_by_sftp(
+                    sftp,
+                    remote_path,
+                    local_path,
+                    sftp.stat(remote_path),
+                    os.path.basename(remote_path),
+                    manifest
+                )
+            return []
 
-        os.makedirs(local_path, exist_ok=True)
+        return self._get_dir_by_sftp(
+            sftp, remote_path, local_path, manifest)
 
-        files = sftp.listdir(remote_path)
-        for file in files:
-            path = f'{remote_path}/{file}'
-            if self.is_dir_sftp(path):
-                self.get_by_sftp(path, local_path, recurse)
+    def _get_dir_by_sftp(
+        self,
+        sftp: SFTPClient,
+        remote_path: str,
+        local_path: str,
+        manifest: TransferManifest = None,
+        prefix: str = ''
+    ) -> List[Tuple[str, str, SFTPAttributes, str]]:
+        os.makedirs(local_path, exist_ok=True)
+        self._known_dirs.add(remote_path)
+
+        large_files = []
+        for attr in sftp.listdir_attr(remote_path):
+            path = f'{remote_path}/{attr.filename}'
+            local = os.path.join(local_path, attr.filename)
+            key = f'{prefix}{attr.filename}'
+            if S_ISDIR(attr.st_mode):
+                large_files.extend(self._get_dir_by_sftp(
+                    sftp, path, local, manifest, f'{key}/'))
                 continue
-            basename, ext = os.path.splitext(os.path.basename(file))
-            if (
-                basename not in FILES_WHITELIST and
-                ext not in EXTENSIONS_WHITELIST
-            ):
+            if not is_whitelisted(attr.filename):
                 continue
-            sftp.get(
-                remotepath=path,
-                localpath=os.path.join(
-                    local_path,
-                    file
-                )
+            if manifest is not None and manifest.is_current(
+                    key, attr.st_size, int(attr.st_mtime), local):
+                continue
+            if self.max_sftp > 1 and attr.st_size >= self.large_file_size:
+                large_files.append((path, local, attr, key))
+                continue
+            if manifest is None:
+                sftp.get(remotepath=path, localpath=local)
+            else:
+                self._get_file_by_sftp(
+                    sftp, path, local, attr, key, manifest)
+
+        return large_files
+
+    def _get_file_by_sftp(
+        self,
+        sftp: SFTPClient,
+        remote_path: str,
+        local_path: str,
+        attr: SFTPAttributes,
+        key: str,
+        manifest: TransferManifest
+    ):
+        # Bytes land in a .part file first, so an interrupted transfer
+        # continues from where it stopped instead of starting over
+        part_path = f'{local_path}{PART_SUFFIX}'
+        mtime = int(attr.st_mtime)
+        offset = manifest.get_resume_offset(
+            key, attr.st_size, mtime, part_path)
+        manifest.files[key] = FileState(size=attr.st_size, mtime=mtime)
+
+        logging.debug(f'sftp get {remote_path} from offset {offset}')
+        with sftp.open(remote_path, 'rb') as remote, \
+                open(part_path, 'ab' if offset else 'wb') as local:
+            local.truncate(offset)
+            remote.seek(offset)
+            remote.prefetch(attr.st_size)
+            write_stream(remote, local)
+
+        os.replace(part_path, local_path)
+        manifest.files[key].complete = True
+
+    def verify_by_sha256(
+        self,
+        remote_path: str,
+        local_path: str,
+        manifest: TransferManifest
+    ):
+        keys = [
+            key for key, state in manifest.files.items()
+            if state.complete and state.sha256 is None
+        ]
+
+        mismatched = []
+        for start in range(0, len(keys), CHECKSUM_BATCH):
+            batch = keys[start:start + CHECKSUM_BATCH]
+            stdout, _ = self.execute_by_ssh(
+                f'cd {shlex.quote(remote_path)} && sha256sum -- ' +
+                ' '.join(shlex.quote(key) for key in batch)
             )
+            remote_sums = {}
+            for line in stdout.splitlines():
+                checksum, _, key = line.partition('  ')
+                remote_sums[key] = checksum
+
+            for key in batch:
+                local = os.path.join(local_path, *key.split('/'))
+                checksum = get_sha256(local)
+                if remote_sums.get(key) == checksum:
+                    manifest.files[key].sha256 = checksum
+                    continue
+
+                mismatched.append(key)
+                manifest.files.pop(key)
+                os.remove(local)
+
+        if mismatched:
+            raise IOError(
+                f'Checksum mismatch in {remote_path}: ' +
+                ', '.join(mismatched)
+            )
+
+    def get_large_by_sftp(self, remote_path: str, local_path: str, size: int):
+        logging.debug(f'sftp parallel get from {remote_path} to {local_path}')
+
+        with open(local_path, 'wb') as file:
+            file.truncate(size)
+
+        segments = split_ranges(size, self.max_sftp, self.chunk_size)
+        try:
+            with ThreadPoolExecutor(max_workers=len(segments)) as pool:
+                futures = [
+                    pool.submit(
+                        self._get_range_by_sftp,
+                        remote_path,
+                        local_path,
+                        offset,
+                        length
+                    )
+                    for offset, length in segments
+                ]
+                for future in futures:
+                    future.result()
+        except Exception:
+            os.remove(local_path)
+            raise
+
+    def _get_range_by_sftp(
+        self,
+        remote_path: str,
+        local_path: str,
+        offset: int,
+        length: int
+    ):
+        end = offset + length
+        chunks = [
+            (start, min(self.chunk_size, end - start))
+            for start in range(offset, end, self.chunk_size)
+        ]
+
+        with self.sftp_session() as sftp:
+            with sftp.open(remote_path, 'rb') as remote, \
+                    open(local_path, 'r+b') as local:
+                local.seek(offset)
+                for data in remote.readv(chunks):
+                    local.write(data)
 
     def mkdir_by_sftp(self, remote_path: str, recurse=False):
-        sftp = self.get_sftp_client()
+        with self.sftp_session() as sftp:
+            self._mkdir_by_sftp(sftp, remote_path, recurse)
 
+    def _mkdir_by_sftp(self, sftp: SFTPClient, remote_path: str, recurse):
         logging.debug(f'sftp mkdir {remote_path}')
 
         if not recurse:
             sftp.mkdir(remote_path)
+            self._known_dirs.add(remote_path)
+            return
+
+        if remote_path in ('', '.', '/') or remote_path in self._known_dirs:
             return
         try:
             sftp.lstat(remote_path)
@@ -176,8 +468,9 @@ class Connection(BaseModel):
             dirname = os.path.dirname(remote_path)
 
             if dirname != '':
-                self.mkdir_by_sftp(dirname, recurse)
+                self._mkdir_by_sftp(sftp, dirname, recurse)
             sftp.mkdir(remote_path)
+        self._known_dirs.add(remote_path)
 
     def mkdir_by_webdav(self, remote_path: str, recurse=False):
         webdav = self.get_webdav_client()
@@ -197,47 +490,179 @@ class Connection(BaseModel):
             self.mkdir_by_webdav(dirname, recurse)
         webdav.mkdir(remote_path)
 
-    def is_dir_sftp(self, path: str) -> bool:
-        sftp = self.get_sftp_client()
+    def is_dir_sftp(self, path: str, sftp: SFTPClient = None) -> bool:
+        if path in self._known_dirs:
+            return True
+        if sftp is None:
+            with self.sftp_session() as sftp:
+                return self.is_dir_sftp(path, sftp)
 
         try:
-            if S_ISDIR(sftp.lstat(path).st_mode):
-                return True
+            is_dir = S_ISDIR(sftp.lstat(path).st_mode)
         except IOError:
             return False
 
+        if is_dir:
+            self._known_dirs.add(path)
+        return is_dir
+
     def put_by_sftp(
         self,
         local_path: str,
         remote_path: str,
         recurse: bool = True
     ):
-        sftp = self.get_sftp_client()
-
+        with self.sftp_session() as sftp:
+            self._put_by_sftp(sftp, local_path, remote_path, recurse)
+
+    def put_stream_by_sftp(self, chunks: Queue, remote_path: str):
+        # Chunks are put by another thread, None ends the stream and an
+        # exception aborts it
+        with self.sftp_session() as sftp:
+            logging.debug(f'sftp stream to {remote_path}')
+            directory = os.path.dirname(remote_path)
+            created = not self.is_dir_sftp(directory, sftp)
+            self._mkdir_by_sftp(sftp, directory, True)
+            try:
+                with sftp.open(remote_path, 'wb') as remote:
+                    remote.set_pipelined(True)
+                    while True:
+                        chunk = chunks.get(timeout=STREAM_TIMEOUT)
+                        if chunk is None:
+                            break
+                        if isinstance(chunk, Exception):
+                            raise chunk
+                        remote.write(chunk)
+            except Exception:
+                try:
+                    sftp.remove(remote_path)
+                except IOError:
+                    pass
+                # The whole folder is uploaded again from a local copy,
+                # it would be nested into the folder left here
+                if created:
+                    try:
+                        sftp.rmdir(directory)
+                    except IOError:
+                        pass
+                    self._known_dirs.discard(directory)
+                raise
+
+    def _put_by_sftp(
+        self,
+        sftp: SFTPClient,
+        local_path: str,
+        remote_path: str,
+        recurse: bool = True
+    ):
         logging.debug(f'sftp put {local_path} to {remote_path}')
 
-        if self.is_dir_sftp(remote_path):
+        if self.is_dir_sftp(remote_path, sftp):
             remote_path = f'{remote_path}/{os.path.basename(local_path)}'
 
         if not recurse or not os.path.isdir(local_path):
-            self.mkdir_by_sftp(os.path.dirname(remote_path), True)
+            self._mkdir_by_sftp(sftp, os.path.dirname(remote_path), True)
 
             sftp.put(localpath=local_path, remotepath=remote_path)
             return
 
-        self.mkdir_by_sftp(remote_path, recurse=True)
+        self._mkdir_by_sftp(sftp, remote_path, recurse=True)
 
         files = os.listdir(local_path)
         for file in files:
             path = os.path.join(local_path, file)
             if os.path.isdir(path):
-                self.put_by_sftp(path, remote_path, recurse)
+                self._put_by_sftp(sftp, path, remote_path, recurse)
                 continue
             sftp.put(
                 localpath=path,
                 remotepath=f'{remote_path}/{file}'
             )
 
+    def get_by_tar(
+        self,
+        remote_path: str,
+        local_path: str,
+        compression: Compressions = Compressions.NONE
+    ):
+        logging.debug(f'tar get from {remote_path} to {local_path}')
+
+        if os.path.isdir(local_path):
+            local_path = os.path.join(
+                local_path,
+                os.path.basename(remote_path)
+            )
+
+        parent, name = os.path.split(remote_path.rstrip('/'))
+        command = (
+            f'cd {shlex.quote(parent or ".")} && '
+            f'{find_whitelisted_command(name)} | '
+            'tar -c --null -T - -f -'
+        )
+        if compression == Compressions.GZIP:
+            command += ' | gzip -c'
+        elif compression == Compressions.ZSTD:
+            command += ' | zstd -c'
+
+        with self._channels:
+            stdin, stdout, stderr = self.exec_command(
+                bash_command(command))
+            stdin.close()
+
+            stream = stdout
+            if compression == Compressions.ZSTD:
+                stream = zstandard.ZstdDecompressor().stream_reader(stdout)
+            mode = 'r|gz' if compression == Compressions.GZIP else 'r|'
+
+            with tarfile.open(fileobj=stream, mode=mode) as tar:
+                extract_tar_stream(tar, name, local_path)
+
+            status = stdout.channel.recv_exit_status()
+            if status != 0:
+                raise IOError(
+                    f'Failed to get {remote_path} with tar: '
+                    f'{stderr.read().decode(errors="replace")}'
+                )
+
+    def put_by_tar(
+        self,
+        local_path: str,
+        remote_path: str,
+        compression: Compressions = Compressions.NONE
+    ):
+        logging.debug(f'tar put {local_path} to {remote_path}')
+
+        command = f'tar -x -f - -C {shlex.quote(remote_path)}'
+        if compression == Compressions.GZIP:
+            command = f'gzip -d -c | {command}'
+        elif compression == Compressions.ZSTD:
+            command = f'zstd -d -c | {command}'
+        command = f'mkdir -p {shlex.quote(remote_path)} && {command}'
+
+        with self._channels:
+            stdin, stdout, stderr = self.exec_command(
+                bash_command(command))
+
+            stream = stdin
+            if compression == Compressions.ZSTD:
+                stream = zstandard.ZstdCompressor().stream_writer(
+                    stdin, closefd=False)
+            mode = 'w|gz' if compression == Compressions.GZIP else 'w|'
+
+            with tarfile.open(fileobj=stream, mode=mode) as tar:
+                for file in sorted(os.listdir(local_path)):
+                    tar.add(os.path.join(local_path, file), arcname=file)
+            if stream is not stdin:
+                stream.close()
+            stdin.channel.shutdown_write()
+
+            status = stdout.channel.recv_exit_status()
+            if status != 0:
+                raise IOError(
+                    f'Failed to put {local_path} with tar: '
+                    f'{stderr.read().decode(errors="replace")}'
+                )
+
     def put_by_webdav(self, local_path: str, remote_path: str):
         webdav = self.get_webdav_client()
 
@@ -304,3 +729,46 @@ class Connection(BaseModel):
         tree = ElementTree.fromstring(r.content)
         data = tree.find('data')
         return data.find('url').text
+
+
+def split_ranges(
+    size: int,
+    parts: int,
+    chunk_size: int
+) -> List[Tuple[int, int]]:
+    parts = max(1, min(parts, -(-size // chunk_size)))
+    step = -(-size // parts)
+
+    return [
+        (offset, min(step, size - offset))
+        for offset in range(0, size, step)
+    ]
+
+
+def bash_command(command: str) -> str:
+    return f'bash -o pipefail -c {shlex.quote(command)}'
+
+
+def extract_tar_stream(tar: tarfile.TarFile, root: str, local_path: str):
+    for member in tar:
+        if not member.isfile():
+            continue
+
+        parts = member.name.split('/')
+        if parts[0] != root or '..' in parts:
+            raise IOError(f'Unexpected path {member.name} in tar stream')
+
+        path = os.path.join(local_path, *parts[1:])
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+        source = tar.extractfile(member)
+        with open(path, 'wb') as target:
+            write_stream(source, target)
+
+
+def write_stream(source: BinaryIO, target: BinaryIO):
+    while True:
+        chunk = source.read(TAR_CHUNK_SIZE)
+        if not chunk:
+            break
+        target.write(chunk)
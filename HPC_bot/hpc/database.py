@@ -1,5 +1,6 @@
 from enum import Enum
-from pydantic import BaseModel, SecretStr
+from typing import Dict, Union
+from pydantic import BaseModel, Field, SecretStr
 
 from .connection import Connection
 
@@ -16,10 +17,22 @@ class DatabaseTypes(Enum):
 class Database(BaseModel):
     name: str = DB_DEFAULT_NAME
 
-    connection: Connection = Connection(
+    connection: Connection = Field(default_factory=lambda: Connection(
         host='localhost',
         port='80',
         user=''
-    )
+    ))
 
     db_type: DatabaseTypes = DatabaseTypes.SQLITE
+
+    # Pooling of MySQL and PostgreSQL connections
+    pooled: bool = True
+    max_connections: int = Field(8, ge=1)
+    stale_timeout: int = Field(300, ge=1)
+    pool_timeout: int = Field(10, ge=0)
+
+    pragmas: Dict[str, Union[int, str]] = {
+        'journal_mode': 'wal',
+        'synchronous': 'normal',
+        'busy_timeout': 5000,
+    }
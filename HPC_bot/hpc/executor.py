@@ -0,0 +1,155 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from threading import Lock
+from typing import Any, Callable, Dict, Optional
+from pydantic import BaseModel, Field, PrivateAttr
+
+from .cluster import Cluster
+
+
+class QueryStats(BaseModel):
+    count: int = 0
+    total: float = 0
+    max: float = 0
+    wait: float = 0
+
+
+class Executor(BaseModel):
+    max_workers: int = Field(4, ge=1)
+    lane_workers: Optional[int] = Field(None, ge=1)
+
+    db_workers: int = Field(1, ge=1)
+    db_queue_size: int = Field(100, ge=1)
+    slow_query_time: float = Field(1, gt=0)
+
+    _pool: Optional[ThreadPoolExecutor] = PrivateAttr(None)
+    _lanes: Dict[str, ThreadPoolExecutor] = PrivateAttr(default_factory=dict)
+    _lock: Lock = PrivateAttr(default_factory=Lock)
+
+    _db_pool: Optional[ThreadPoolExecutor] = PrivateAttr(None)
+    _db_slots: Optional[asyncio.Semaphore] = PrivateAttr(None)
+    _db_loop: Optional[asyncio.AbstractEventLoop] = PrivateAttr(None)
+    _db_stats: Dict[str, QueryStats] = PrivateAttr(default_factory=dict)
+
+    def get_pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix='hpc_bot'
+                )
+            return self._pool
+
+    def get_db_pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._db_pool is None:
+                self._db_pool = ThreadPoolExecutor(
+                    max_workers=self.db_workers,
+                    thread_name_prefix='hpc_bot_db'
+                )
+            return self._db_pool
+
+    def get_lane(self, label: str, workers: int = 1) -> ThreadPoolExecutor:
+        with self._lock:
+            lane = self._lanes.get(label)
+            if lane is None:
+                lane = ThreadPoolExecutor(
+                    max_workers=self.lane_workers or workers,
+                    thread_name_prefix=f'hpc_bot_{label}'
+                )
+                self._lanes[label] = lane
+            return lane
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.get_pool(),
+            partial(func, *args, **kwargs)
+        )
+
+    async def run_on_cluster(
+        self,
+        cluster: Cluster,
+        func: Callable,
+        *args,
+        **kwargs
+    ) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.get_lane(cluster.label, cluster.connection.max_channels),
+            partial(func, *args, **kwargs)
+        )
+
+    def get_db_slots(self) -> asyncio.Semaphore:
+        # Queries beyond the queue size wait in the event loop, so a slow
+        # database does not pile up unbounded work in the pool
+        loop = asyncio.get_running_loop()
+        if self._db_slots is None or self._db_loop is not loop:
+            self._db_slots = asyncio.Semaphore(
+                self.db_workers + self.db_queue_size)
+            self._db_loop = loop
+        return self._db_slots
+
+    async def run_db(
+        self,
+        name: str,
+        func: Callable,
+        *args,
+        **kwargs
+    ) -> Any:
+        loop = asyncio.get_running_loop()
+        queued = time.perf_counter()
+
+        def timed():
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add_db_stats(
+                    name,
+                    time.perf_counter() - started,
+                    started - queued
+                )
+
+        async with self.get_db_slots():
+            return await loop.run_in_executor(self.get_db_pool(), timed)
+
+    def add_db_stats(self, name: str, elapsed: float, wait: float):
+        with self._lock:
+            stats = self._db_stats.setdefault(name, QueryStats())
+            stats.count += 1
+            stats.total += elapsed
+            stats.max = max(stats.max, elapsed)
+            stats.wait += wait
+
+        message = (
+            f'Query {name} took {elapsed * 1000:.1f} ms '
+            f'({wait * 1000:.1f} ms in queue)'
+        )
+        if elapsed >= self.slow_query_time:
+            logging.warning(message)
+        else:
+            logging.debug(message)
+
+    def get_db_stats(self) -> Dict[str, QueryStats]:
+        with self._lock:
+            return {
+                name: stats.model_copy()
+                for name, stats in self._db_stats.items()
+            }
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            pools = list(self._lanes.values())
+            for pool in (self._pool, self._db_pool):
+                if pool is not None:
+                    pools.append(pool)
+            self._pool = None
+            self._db_pool = None
+            self._lanes = {}
+
+        for pool in pools:
+            pool.shutdown(wait=wait)
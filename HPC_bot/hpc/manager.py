@@ -1,15 +1,19 @@
 import asyncio
 from datetime import datetime
+import io
 import logging
 import os
 import re
-from random import randint
-from typing import List, Tuple, Dict
+import shlex
+from queue import Queue
+from typing import Any, Awaitable, BinaryIO, Callable, Dict, List, Optional
+from typing import Tuple
 
 from .cluster import Cluster
+from .connection import bash_command
 from .runner import Runner
 from ..utils import config
-from ..models import db, Calculation, CalculationStatus
+from ..models import db, async_db, Calculation, CalculationStatus
 from ..models import Cluster as ClusterModel
 
 
@@ -17,9 +21,50 @@ SLURM_ID_RE = re.compile(r'Submitted batch job (\d+)', re.IGNORECASE)
 
 SLURM_RUNNER = Runner(
     program='squeue',
-    allowed_args=['-o "%.15i %.5t"'],
-    default_args=['-o "%.15i %.5t"']
+    allowed_args=['-h', '-r', '-o "%i %t %L"', r'-j [\d,]+'],
+    default_args=['-h', '-r', '-o "%i %t %L"']
 )
+# Array tasks are reported as <job>_<task>, pending ranges as <job>_[1-5]
+JobKey = Tuple[int, Optional[int]]
+JOB_ID_RE = re.compile(r'(\d+)(?:_(\d+))?')
+SQUEUE_CHUNK_SIZE = 200
+SUBMIT_BATCH_SIZE = 50
+
+SACCT_FIELDS = 'JobID,State,ExitCode,ElapsedRaw,CPUTimeRAW,MaxRSS'
+SACCT_RUNNER = Runner(
+    program='sacct',
+    allowed_args=['-n', '-P', f'-o {SACCT_FIELDS}', r'-j [\d,]+'],
+    default_args=['-n', '-P', f'-o {SACCT_FIELDS}']
+)
+SACCT_STATES = {
+    'COMPLETED': CalculationStatus.FINISHED_OK,
+    'FAILED': CalculationStatus.FAILED,
+    'NODE_FAIL': CalculationStatus.FAILED,
+    'BOOT_FAIL': CalculationStatus.FAILED,
+    'OUT_OF_MEMORY': CalculationStatus.FAILED,
+    'PREEMPTED': CalculationStatus.FAILED,
+    'TIMEOUT': CalculationStatus.TIMEOUT,
+    'DEADLINE': CalculationStatus.TIMEOUT,
+    'CANCELLED': CalculationStatus.CANCELLED,
+}
+ACCOUNTING_FIELDS = [
+    'slurm_state',
+    'exit_code',
+    'elapsed',
+    'cpu_time',
+    'max_rss',
+]
+ARRAY_MAX_SIZE = 1000
+ARRAY_FOLDER = 'arrays'
+ARRAY_WRAPPER = '''\
+line=$(sed -n "$((SLURM_ARRAY_TASK_ID + 1))p" "$SLURM_SUBMIT_DIR/index")
+dir=${line%%$'\\t'*}
+file=${line#*$'\\t'}
+cd "$dir" || exit 1
+export SLURM_SUBMIT_DIR="$dir"
+exec > "slurm-${SLURM_ARRAY_JOB_ID}_${SLURM_ARRAY_TASK_ID}.out" 2>&1
+'''
+MEMORY_UNITS = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
 
 
 def create_calculation_path(calculation: Calculation) -> str:
@@ -56,7 +101,9 @@ def select_cluster(
     if len(clusters) == 0:
         return None, None, None
 
-    cluster, runner = clusters[0]
+    runners = {c.label: r for c, r in clusters}
+    cluster = config.placement.rank([c for c, _ in clusters])[0]
+    runner = runners[cluster.label]
 
     if command is not None:
         args = runner.split_command(command)
@@ -66,19 +113,6 @@ def select_cluster(
     return cluster, runner, args
 
 
-def locate_clusters(
-    calculations: List[Calculation]
- ) -> Dict[str, List[Calculation]]:
-    cluster_labels = set(c.cluster.label for c in calculations)
-
-    return {label: list(
-        filter(
-            lambda x: x.cluster.label == label,
-            calculations
-        )
-    ) for label in cluster_labels}
-
-
 async def upload_to_cluster(
     calculation: Calculation,
     cluster: Cluster,
@@ -89,7 +123,9 @@ async def upload_to_cluster(
     )
 
     try:
-        return cluster.upload_file(
+        return await config.executor.run_on_cluster(
+            cluster,
+            cluster.upload_file,
             local_path=calculation_path,
             local_root=config.download_path
         )
@@ -97,31 +133,77 @@ async def upload_to_cluster(
         return None
 
 
-async def upload_to_clusters():
-    calculations = Calculation.get_by_status(CalculationStatus.NOT_STARTED)
+class StreamingBuffer(io.BytesIO):
+    # Keeps the received file and passes every chunk to the SFTP writer
+    def __init__(self, chunks: Queue):
+        super().__init__()
+        self.chunks = chunks
 
-    cluster_calc = locate_clusters(calculations)
+    def write(self, data) -> int:
+        self.chunks.put(bytes(data))
+        return super().write(data)
 
-    updated = []
-    for cluster in config.clusters:
 
-        calculations = cluster_calc.get(cluster.label)
+async def stream_to_cluster(
+    calculation: Calculation,
+    cluster: Cluster,
+    download: Callable[[BinaryIO], Awaitable]
+) -> bool:
+    # The file goes to the cluster while it is downloaded, a local copy
+    # is saved only if the upload fails. Download errors are raised
+    chunks = Queue()
+    buffer = StreamingBuffer(chunks)
+    upload = asyncio.ensure_future(config.executor.run_on_cluster(
+        cluster,
+        cluster.upload_stream,
+        chunks,
+        f'{calculation.get_folder_name()}/{calculation.name}'
+    ))
 
-        if calculations is None:
-            continue
+    try:
+        await download(buffer)
+    except BaseException:
+        chunks.put(IOError('Download is interrupted'))
+        await asyncio.gather(upload, return_exceptions=True)
+        raise
+    chunks.put(None)
+
+    try:
+        await upload
+    except Exception as e:
+        logging.warning(
+            f'Failed to stream calculation {calculation.name} to cluster '
+            f'{cluster.label}, it will be uploaded from a local copy',
+            exc_info=e
+        )
+        with open(create_calculation_path(calculation), 'wb') as file:
+            file.write(buffer.getvalue())
+        return False
 
-        for calculation in calculations:
-            path = await upload_to_cluster(calculation, cluster)
+    calculation.set_status(CalculationStatus.UPLOADED)
+    await async_db.run(
+        'set_uploaded', calculation.save, only=[Calculation.status])
+    return True
 
-            if path is None:
-                logging.warning(
-                    f'Failed to upload calculation {calculation.name}'
-                    f' to cluster {cluster.label}'
-                )
-                continue
-            else:
-                calculation.set_status(CalculationStatus.UPLOADED)
-            updated.append(calculation)
+
+async def upload_calculations(
+    cluster: Cluster,
+    calculations: List[Calculation]
+) -> List[Calculation]:
+
+    updated = []
+    for calculation in calculations:
+        path = await upload_to_cluster(calculation, cluster)
+
+        if path is None:
+            logging.warning(
+                f'Failed to upload calculation {calculation.name}'
+                f' to cluster {cluster.label}'
+            )
+            continue
+
+        calculation.set_status(CalculationStatus.UPLOADED)
+        updated.append(calculation)
 
     if updated:
         with db.atomic():
@@ -129,69 +211,200 @@ async def upload_to_clusters():
                 updated,
                 fields=['status']
             )
+    return updated
 
 
-def start_calculation(
-    calculation: Calculation,
+def start_batch(
+    calculations: List[Calculation],
     cluster: Cluster,
-) -> bool:
-    basename = calculation.name
-    directory = f'{cluster.upload_path}/{calculation.get_folder_name()}'
+) -> List[Optional[int]]:
+    # Runs in a cluster lane: only reads loaded fields, never the database
+    directories = [
+        f'{cluster.upload_path}/{c.get_folder_name()}' for c in calculations
+    ]
+    outputs = cluster.perform_commands([
+        (c.command, c.name, directory)
+        for c, directory in zip(calculations, directories)
+    ])
+
+    slurm_ids = []
+    for calculation, directory, stdout in zip(
+            calculations, directories, outputs):
+        if stdout is None:
+            logging.warning(f'Illegal command {calculation.command}')
+            slurm_ids.append(None)
+            continue
 
-    result = cluster.perform_command(
-        command=calculation.command,
-        filename=basename,
-        chdir=directory
+        matched = SLURM_ID_RE.search(stdout)
+        if matched is None:
+            logging.warning(
+                'No slurm id returned '
+                f'while setting up calculation #{calculation.id} '
+                f'({directory}/{calculation.name}). '
+                f'Output is {stdout}')
+            slurm_ids.append(None)
+            continue
+
+        slurm_ids.append(int(matched.group(1)))
+    return slurm_ids
+
+
+def get_array_parts(
+    cluster: Cluster,
+    command: str
+) -> Optional[Tuple[List[str], str, List[str]]]:
+    # Splits 'sbatch --opt=value script.sh args' into options, script and
+    # its arguments. Other commands cannot be packed into an array
+    runner, args = cluster.find_suitable_runner(command)
+    if runner is None or runner.program != 'sbatch':
+        return None
+
+    for i, arg in enumerate(args):
+        if not arg.startswith('-'):
+            return args[:i], arg, args[i + 1:]
+    return None
+
+
+def split_arrays(
+    cluster: Cluster,
+    calculations: List[Calculation]
+) -> Tuple[List[List[Calculation]], List[Calculation]]:
+    if not cluster.array_packing:
+        return [], calculations
+
+    groups: Dict[str, List[Calculation]] = {}
+    for calculation in calculations:
+        groups.setdefault(calculation.command, []).append(calculation)
+
+    arrays = []
+    singles = []
+    for command, group in groups.items():
+        if len(group) < 2 or get_array_parts(cluster, command) is None:
+            singles.extend(group)
+            continue
+        for start in range(0, len(group), ARRAY_MAX_SIZE):
+            arrays.append(group[start:start + ARRAY_MAX_SIZE])
+    return arrays, singles
+
+
+def create_array_script(
+    calculations: List[Calculation],
+    cluster: Cluster
+) -> str:
+    options, script, args = get_array_parts(
+        cluster, calculations[0].command)
+    directories = [
+        f'{cluster.upload_path}/{c.get_folder_name()}' for c in calculations
+    ]
+    array_dir = shlex.quote(
+        f'{cluster.upload_path}/{ARRAY_FOLDER}/'
+        f'{calculations[0].get_folder_name()}'
     )
-    if result is None:
-        logging.warning(f'Illegal command {calculation.command}')
-        return False
 
-    stdout, stderr = result
+    # The original script runs with bash, so its #SBATCH headers are
+    # copied into the wrapper to keep the requested resources
+    command = ' '.join(
+        ['exec', 'bash', shlex.quote(script)] +
+        ['"$file"' if a == '{}' else shlex.quote(a) for a in args]
+    )
+    lines = [
+        'set -e',
+        f'mkdir -p {array_dir}',
+        '{',
+    ] + [
+        f"printf '%s\\t%s\\n' \"$(cd {shlex.quote(d)} && pwd)\" "
+        f'{shlex.quote(c.name)}'
+        for c, d in zip(calculations, directories)
+    ] + [
+        f'}} > {array_dir}/index',
+        '{',
+        "echo '#!/bin/bash'",
+        f"(cd {shlex.quote(directories[0])} && "
+        f"grep '^#SBATCH' {shlex.quote(script)} || true)",
+        "cat <<'HPC_BOT_EOF'",
+        ARRAY_WRAPPER + command,
+        'HPC_BOT_EOF',
+        f'}} > {array_dir}/job.sh',
+        f'cd {array_dir}',
+        ' '.join(
+            ['sbatch', f'--array=0-{len(calculations) - 1}'] +
+            [shlex.quote(o) for o in options] +
+            ['job.sh']
+        ),
+    ]
+    return '\n'.join(lines)
+
+
+def start_array(
+    calculations: List[Calculation],
+    cluster: Cluster,
+) -> Optional[int]:
+    # Runs in a cluster lane: only reads loaded fields, never the database
+    stdout, stderr = cluster.connection.execute_by_ssh(
+        bash_command(create_array_script(calculations, cluster)))
 
     matched = SLURM_ID_RE.search(stdout)
     if matched is None:
         logging.warning(
-            'No slurm id returned '
-            f'while setting up calculation #{calculation.id} '
-            f'({directory}/{basename}). '
+            f'No slurm id returned for array of {len(calculations)} '
+            f'calculations starting from #{calculations[0].id}. '
             f'Output is {stdout}\nStderr is {stderr}')
-        return False
-
-    slurm_id = int(matched.group(1))
-
-    calculation.slurm_id = slurm_id
-    return True
+        return None
 
+    return int(matched.group(1))
 
-async def start_calculations():
-    calculations = Calculation.get_by_status(CalculationStatus.UPLOADED)
 
-    cluster_calc = locate_clusters(calculations)
+async def start_calculations(
+    cluster: Cluster,
+    calculations: List[Calculation]
+) -> List[Calculation]:
 
     updated = []
-    for cluster in config.clusters:
+    arrays, calculations = split_arrays(cluster, calculations)
+    for array in arrays:
+        slurm_id = await config.executor.run_on_cluster(
+            cluster,
+            start_array,
+            array,
+            cluster
+        )
+        if slurm_id is None:
+            # Submitted one by one below
+            calculations.extend(array)
+            continue
 
-        calculations = cluster_calc.get(cluster.label)
+        for task_id, calculation in enumerate(array):
+            calculation.slurm_id = slurm_id
+            calculation.array_task_id = task_id
+            calculation.set_status(CalculationStatus.PENDING)
+            updated.append(calculation)
 
-        if calculations is None:
-            continue
+    for start in range(0, len(calculations), SUBMIT_BATCH_SIZE):
+        batch = calculations[start:start + SUBMIT_BATCH_SIZE]
+        slurm_ids = await config.executor.run_on_cluster(
+            cluster,
+            start_batch,
+            batch,
+            cluster
+        )
 
-        for calculation in calculations:
-            started = start_calculation(calculation, cluster)
+        for calculation, slurm_id in zip(batch, slurm_ids):
+            if slurm_id is None:
+                logging.warning(
+                    f'Failed to start calculation {calculation.name}')
+                continue
 
-            if started:
-                calculation.set_status(CalculationStatus.PENDING)
-                updated.append(started)
-            else:
-                logging.warning(f'Failed to start calculation {calculation.name}')
+            calculation.slurm_id = slurm_id
+            calculation.set_status(CalculationStatus.PENDING)
+            updated.append(calculation)
 
     if updated:
         with db.atomic():
             Calculation.bulk_update(
-                calculations,
-                fields=['status', 'slurm_id']
+                updated,
+                fields=['status', 'slurm_id', 'array_task_id']
             )
+    return updated
 
 
 def update_db():
@@ -207,52 +420,201 @@ def update_db():
         )
 
 
-async def check_updates():
-    calculations = Calculation.get_unfinished()
+def parse_job_id(job_id: str) -> Optional[JobKey]:
+    matched = JOB_ID_RE.fullmatch(job_id)
+    if matched is None:
+        return None
+    task = matched.group(2)
+    return int(matched.group(1)), None if task is None else int(task)
 
-    cluster_calc = locate_clusters(calculations)
 
-    updated_time = []
-    updated_status = []
-    for cluster in config.clusters:
+def parse_slurm_time(value: str) -> Optional[int]:
+    # [days-]hours:minutes:seconds, minutes:seconds or minutes;
+    # UNLIMITED, NOT_SET and INVALID give None
+    days, _, clock = value.rpartition('-')
+    parts = clock.split(':')
+    if not all(p.isdigit() for p in parts) or len(parts) > 3:
+        return None
+    if days and not days.isdigit():
+        return None
+
+    if len(parts) == 1:
+        parts = [0, parts[0], 0]
+    seconds = 0
+    for part in parts:
+        seconds = seconds * 60 + int(part)
+    return seconds + int(days or 0) * 86400
 
-        if cluster_calc.get(cluster.label) is None:
+
+def parse_squeue(stdout: str) -> Dict[JobKey, Tuple[str, Optional[int]]]:
+    states = {}
+    for line in stdout.splitlines():
+        parts = line.split()
+        if len(parts) != 3:
+            continue
+        key = parse_job_id(parts[0])
+        if key is None:
             continue
+        states[key] = parts[1], parse_slurm_time(parts[2])
+    return states
 
-        stdout, stderr = cluster.start_runner(SLURM_RUNNER)
+
+def poll_slurm(
+    cluster: Cluster,
+    slurm_ids: List[int]
+) -> Dict[JobKey, Tuple[str, Optional[int]]]:
+    states = {}
+    for start in range(0, len(slurm_ids), SQUEUE_CHUNK_SIZE):
+        chunk = slurm_ids[start:start + SQUEUE_CHUNK_SIZE]
+        stdout, stderr = cluster.start_runner(
+            SLURM_RUNNER,
+            SLURM_RUNNER.default_args + [
+                '-j ' + ','.join(str(i) for i in chunk)
+            ]
+        )
         logging.debug(f'Slurm output is {stdout}\n, stderr is {stderr}')
 
-        slurm_data = [line.split() for line in filter(
-            lambda x: x.strip(), stdout.split('\n')[1:]
-        )]
+        # squeue rejects a list made only of purged jobs, which simply
+        # means they all have finished; any other error must not
+        if stderr.strip() and 'invalid job id' not in stderr.lower():
+            raise RuntimeError(f'squeue failed on {cluster.label}: {stderr}')
+        states.update(parse_squeue(stdout))
+    return states
 
-        slurm_status = [
-            CalculationStatus.from_slurm(status) for _, status in slurm_data
-        ]
-        slurm_ids = [int(idx) for idx, _ in slurm_data]
 
-        for calc in cluster_calc[cluster.label]:
-            if calc.slurm_id is None:
-                continue
+def parse_memory(value: str) -> Optional[int]:
+    if not value:
+        return None
+    unit = MEMORY_UNITS.get(value[-1].upper())
+    try:
+        if unit is None:
+            return int(float(value))
+        return int(float(value[:-1]) * unit)
+    except ValueError:
+        return None
 
-            try:
-                index = slurm_ids.index(calc.slurm_id)
-            except ValueError:
-                calc.end_datetime = datetime.utcnow()
-                calc.set_status(CalculationStatus.FINISHED_OK)
-                updated_time.append(calc)
-                continue
 
-            if calc.get_status() >= slurm_status[index]:
-                continue
-            calc.set_status(slurm_status[index])
+def parse_int(value: str) -> Optional[int]:
+    return int(value) if value.isdigit() else None
+
+
+def parse_sacct(stdout: str) -> Dict[JobKey, Dict[str, Any]]:
+    jobs = {}
+    for line in stdout.splitlines():
+        parts = line.split('|')
+        if len(parts) != 6:
+            continue
+        job_id, state, exit_code, elapsed, cpu_time, max_rss = parts
+
+        # Steps (123.batch, 123.0) only report memory of the job 123
+        base, _, step = job_id.partition('.')
+        key = parse_job_id(base)
+        if key is None:
+            continue
+        job = jobs.setdefault(
+            key, {field: None for field in ACCOUNTING_FIELDS})
+
+        rss = parse_memory(max_rss)
+        if rss is not None:
+            job['max_rss'] = max(rss, job['max_rss'] or 0)
+        if step:
+            continue
+
+        job['slurm_state'] = state.split()[0] if state else None
+        job['exit_code'] = exit_code or None
+        job['elapsed'] = parse_int(elapsed)
+        job['cpu_time'] = parse_int(cpu_time)
+    return jobs
+
+
+def poll_sacct(
+    cluster: Cluster,
+    slurm_ids: List[int]
+) -> Dict[JobKey, Dict[str, Any]]:
+    jobs = {}
+    for start in range(0, len(slurm_ids), SQUEUE_CHUNK_SIZE):
+        chunk = slurm_ids[start:start + SQUEUE_CHUNK_SIZE]
+        stdout, stderr = cluster.start_runner(
+            SACCT_RUNNER,
+            SACCT_RUNNER.default_args + [
+                '-j ' + ','.join(str(i) for i in chunk)
+            ]
+        )
+        logging.debug(f'Sacct output is {stdout}\n, stderr is {stderr}')
+
+        if stderr.strip():
+            raise RuntimeError(f'sacct failed on {cluster.label}: {stderr}')
+        jobs.update(parse_sacct(stdout))
+    return jobs
+
+
+async def check_updates(
+    cluster: Cluster,
+    calculations: List[Calculation]
+) -> Tuple[List[Calculation], Optional[int]]:
+    # Also returns the shortest time left among running jobs, if known
+
+    calculations = [c for c in calculations if c.slurm_id is not None]
+    if not calculations:
+        return [], None
+
+    states = await config.executor.run_on_cluster(
+        cluster,
+        poll_slurm,
+        cluster,
+        sorted({c.slurm_id for c in calculations})
+    )
+
+    finished = []
+    updated_status = []
+    time_left = None
+    for calc in calculations:
+        state, left = states.get(calc.get_job_key(), (None, None))
+        if state is None:
+            status = CalculationStatus.FINISHED_OK
+        else:
+            status = CalculationStatus.from_slurm(state)
+
+        if status == CalculationStatus.RUNNING and left is not None:
+            time_left = left if time_left is None else min(time_left, left)
+
+        if status is None:
+            logging.warning(
+                f'Unknown slurm state {state} of job {calc.slurm_id}')
+            continue
+        if calc.get_status() >= status:
+            continue
+
+        calc.set_status(status)
+        if status.is_finished():
+            calc.end_datetime = datetime.utcnow()
+            finished.append(calc)
+        else:
             updated_status.append(calc)
 
-    if updated_time:
+    if finished and cluster.accounting:
+        accounting = await config.executor.run_on_cluster(
+            cluster,
+            poll_sacct,
+            cluster,
+            sorted({c.slurm_id for c in finished})
+        )
+        for calc in finished:
+            job = accounting.get(calc.get_job_key())
+            if job is None:
+                continue
+            for field in ACCOUNTING_FIELDS:
+                setattr(calc, field, job[field])
+
+            status = SACCT_STATES.get(job['slurm_state'])
+            if status is not None:
+                calc.set_status(status)
+
+    if finished:
         with db.atomic():
             Calculation.bulk_update(
-                updated_time,
-                fields=['status', 'end_datetime']
+                finished,
+                fields=['status', 'end_datetime'] + ACCOUNTING_FIELDS
             )
     if updated_status:
         with db.atomic():
@@ -260,30 +622,31 @@ async def check_updates():
                 updated_status,
                 fields=['status']
             )
+    return finished, time_left
 
 
-async def load_finished():
-    calculations = Calculation.get_by_status(CalculationStatus.FINISHED_OK)
+async def load_finished(
+    cluster: Cluster,
+    calculations: List[Calculation]
+) -> List[Calculation]:
 
-    cluster_calc = locate_clusters(calculations)
+    if not calculations:
+        return []
 
-    updated = []
-    for cluster in config.clusters:
-        calcs = cluster_calc.get(cluster.label)
+    folders = [c.get_folder_name() for c in calculations]
+    success = await config.executor.run_on_cluster(
+        cluster,
+        cluster.download_dirs,
+        folders,
+        [config.download_path for f in folders]
+    )
 
-        if calcs is None:
+    updated = []
+    for calc, succ in zip(calculations, success):
+        if not succ:
             continue
-
-        folders = [c.get_folder_name() for c in calcs]
-        success = cluster.download_dirs(
-            folders,
-            [config.download_path for f in folders]
-        )
-        for calc, succ in zip(calcs, success):
-            if not succ:
-                continue
-            calc.set_status(CalculationStatus.LOADED)
-            updated.append(calc)
+        calc.set_status(CalculationStatus.LOADED)
+        updated.append(calc)
 
     if len(updated) > 0:
         with db.atomic():
@@ -291,35 +654,50 @@ async def load_finished():
                 updated,
                 fields=['status']
             )
+    return updated
 
 
-async def send_to_cloud():
-    calculations = Calculation.get_by_status(CalculationStatus.LOADED)
+async def sync_running(
+    cluster: Cluster,
+    calculations: List[Calculation]
+) -> List[Calculation]:
+    # Mirrors results of running jobs, so load_finished only moves the
+    # last delta. Files still change here, so checksums wait for the end
+    if not calculations:
+        return []
+
+    folders = [c.get_folder_name() for c in calculations]
+    success = await config.executor.run_on_cluster(
+        cluster,
+        cluster.download_dirs,
+        folders,
+        [config.download_path for f in folders],
+        verify=False
+    )
+    return [c for c, succ in zip(calculations, success) if succ]
+
 
-    cluster_calc = locate_clusters(calculations)
+async def send_to_cloud(
+    calculations: List[Calculation]
+) -> List[Calculation]:
 
     updated = []
-    for cluster in config.clusters:
-        calcs = cluster_calc.get(cluster.label)
-
-        if calcs is None:
+    for calc in calculations:
+        folder = calc.get_folder_name()
+        try:
+            await config.executor.run(
+                config.storage.put,
+                local_path=os.path.join(
+                    config.download_path,
+                    folder
+                ),
+                remote_path=folder
+            )
+        except Exception as e:
+            logging.error('Failed to upload to storage', exc_info=e)
             continue
-
-        folders = [c.get_folder_name() for c in calcs]
-        for fold, calc in zip(folders, calcs):
-            try:
-                config.storage.put(
-                    local_path=os.path.join(
-                        config.download_path,
-                        fold
-                    ),
-                    remote_path=fold
-                )
-            except Exception as e:
-                logging.error('Failed to upload to storage', exc_info=e)
-                continue
-            calc.set_status(CalculationStatus.CLOUDED)
-            updated.append(calc)
+        calc.set_status(CalculationStatus.CLOUDED)
+        updated.append(calc)
 
     if len(updated) > 0:
         with db.atomic():
@@ -327,3 +705,4 @@ async def send_to_cloud():
                 updated,
                 fields=['status']
             )
+    return updated
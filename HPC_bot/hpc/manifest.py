@@ -0,0 +1,86 @@
+import hashlib
+import os
+from typing import Dict, Optional
+from pydantic import BaseModel
+
+
+MANIFESTS_FOLDER = '.manifests'
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class FileState(BaseModel):
+    size: int
+    mtime: int
+    complete: bool = False
+    sha256: Optional[str] = None
+
+
+class TransferManifest(BaseModel):
+    files: Dict[str, FileState] = {}
+
+    @staticmethod
+    def get_path(local_root: str, name: str) -> str:
+        return os.path.join(local_root, MANIFESTS_FOLDER, f'{name}.json')
+
+    @staticmethod
+    def load(path: str) -> 'TransferManifest':
+        try:
+            with open(path, 'r', encoding='utf-8') as file:
+                return TransferManifest.model_validate_json(file.read())
+        except (FileNotFoundError, ValueError):
+            return TransferManifest()
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            file.write(self.model_dump_json())
+        os.replace(tmp_path, path)
+
+    def is_current(
+        self,
+        key: str,
+        size: int,
+        mtime: int,
+        local_path: str
+    ) -> bool:
+        state = self.files.get(key)
+        if state is None or not state.complete:
+            return False
+        if state.size != size or state.mtime != mtime:
+            return False
+
+        return (
+            os.path.isfile(local_path) and
+            os.path.getsize(local_path) == size
+        )
+
+    def get_resume_offset(
+        self,
+        key: str,
+        size: int,
+        mtime: int,
+        part_path: str
+    ) -> int:
+        state = self.files.get(key)
+        if state is None or state.complete:
+            return 0
+        if state.size != size or state.mtime != mtime:
+            return 0
+        if not os.path.isfile(part_path):
+            return 0
+
+        offset = os.path.getsize(part_path)
+        return offset if offset <= size else 0
+
+
+def get_sha256(path: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as file:
+        while True:
+            chunk = file.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            sha256.update(chunk)
+    return sha256.hexdigest()
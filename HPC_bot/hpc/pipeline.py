@@ -0,0 +1,63 @@
+import asyncio
+from typing import Dict, List
+
+from ..models import Calculation, CalculationStatus
+
+
+STORAGE_QUEUE = 'storage'
+NOTIFICATION_QUEUE = 'notifications'
+
+
+class JobQueue:
+    def __init__(self):
+        self._jobs: Dict[int, Calculation] = {}
+        self._event = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+    def __contains__(self, calculation: Calculation) -> bool:
+        return calculation.id in self._jobs
+
+    def put(self, *calculations: Calculation):
+        for calculation in calculations:
+            self._jobs[calculation.id] = calculation
+        if calculations:
+            self._event.set()
+
+    def get(self, *statuses: CalculationStatus) -> List[Calculation]:
+        return [
+            c for c in self._jobs.values()
+            if c.get_status() in statuses
+        ]
+
+    def remove(self, *calculations: Calculation):
+        for calculation in calculations:
+            self._jobs.pop(calculation.id, None)
+
+    def clear(self):
+        self._jobs.clear()
+
+    async def wait(self, timeout: float) -> bool:
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self._event.clear()
+
+
+queues: Dict[str, JobQueue] = {}
+
+
+def get_queue(name: str) -> JobQueue:
+    queue = queues.get(name)
+    if queue is None:
+        queue = JobQueue()
+        queues[name] = queue
+    return queue
+
+
+def submit(calculation: Calculation, cluster_label: str):
+    get_queue(cluster_label).put(calculation)
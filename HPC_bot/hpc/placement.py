@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from pydantic import BaseModel, Field, PrivateAttr
+
+from .cluster import Cluster
+from .runner import Runner
+
+
+SINFO_RUNNER = Runner(
+    program='sinfo',
+    allowed_args=['-h', '-o "%D %t"'],
+    default_args=['-h', '-o "%D %t"']
+)
+PENDING_RUNNER = Runner(
+    program='squeue',
+    allowed_args=['-h', '-t PD', '-o "%i"'],
+    default_args=['-h', '-t PD', '-o "%i"']
+)
+FREE_NODE_STATES = ['idle', 'mix']
+
+
+class LoadSnapshot(BaseModel):
+    free_nodes: int
+    pending_jobs: int
+    time: datetime = Field(default_factory=datetime.utcnow)
+
+
+class Placement(BaseModel):
+    refresh_time: int = Field(300, ge=1)
+    stale_time: int = Field(900, ge=1)
+
+    free_nodes_weight: float = 1.0
+    pending_jobs_weight: float = 1.0
+
+    _snapshots: Dict[str, LoadSnapshot] = PrivateAttr(default_factory=dict)
+
+    def update(self, label: str, snapshot: LoadSnapshot):
+        self._snapshots[label] = snapshot
+
+    def get_snapshot(self, label: str) -> Optional[LoadSnapshot]:
+        snapshot = self._snapshots.get(label)
+        if snapshot is None:
+            return None
+        if datetime.utcnow() - snapshot.time > timedelta(
+                seconds=self.stale_time):
+            return None
+        return snapshot
+
+    def get_score(self, snapshot: LoadSnapshot) -> float:
+        # Lower is better: a rough estimate of the wait in the queue
+        return (
+            self.pending_jobs_weight * snapshot.pending_jobs -
+            self.free_nodes_weight * snapshot.free_nodes
+        )
+
+    def rank(self, clusters: List[Cluster]) -> List[Cluster]:
+        fresh = []
+        stale = []
+        for cluster in clusters:
+            snapshot = self.get_snapshot(cluster.label)
+            if snapshot is None:
+                stale.append(cluster)
+            else:
+                fresh.append((self.get_score(snapshot), cluster))
+
+        # sorted is stable, so equal scores keep the config order
+        fresh = sorted(fresh, key=lambda x: x[0])
+        return [cluster for _, cluster in fresh] + stale
+
+
+def parse_free_nodes(stdout: str) -> int:
+    free_nodes = 0
+    for line in stdout.splitlines():
+        parts = line.split()
+        if len(parts) != 2 or not parts[0].isdigit():
+            continue
+        # '*' marks nodes that do not respond, other suffixes are flags
+        count, state = parts
+        if state.endswith('*'):
+            continue
+        if state.rstrip('~#!%$@^-+') in FREE_NODE_STATES:
+            free_nodes += int(count)
+    return free_nodes
+
+
+def get_load(cluster: Cluster) -> LoadSnapshot:
+    stdout, _ = cluster.start_runner(SINFO_RUNNER)
+    free_nodes = parse_free_nodes(stdout)
+
+    stdout, _ = cluster.start_runner(PENDING_RUNNER)
+    pending_jobs = len([line for line in stdout.splitlines() if line.strip()])
+
+    return LoadSnapshot(free_nodes=free_nodes, pending_jobs=pending_jobs)
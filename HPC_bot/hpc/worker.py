@@ -0,0 +1,305 @@
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from random import uniform
+from typing import Dict, List, Optional, Tuple, Union
+
+from .cluster import Cluster
+from .manager import upload_calculations, start_calculations
+from .manager import check_updates, sync_running, load_finished
+from .manager import send_to_cloud
+from .placement import get_load
+from .pipeline import STORAGE_QUEUE, NOTIFICATION_QUEUE, get_queue
+from ..models import Calculation, CalculationStatus, connection_scope
+from ..utils import config, get_fetch_time
+
+
+FAST_POLLS = 3
+HANDOFF_STATUSES = [
+    CalculationStatus.NOT_STARTED,
+    CalculationStatus.UPLOADED,
+]
+ACTIVE_STATUSES = [
+    CalculationStatus.NOT_STARTED,
+    CalculationStatus.UPLOADED,
+    CalculationStatus.PENDING,
+    CalculationStatus.RUNNING,
+]
+
+
+def has_calculations(*statuses: CalculationStatus) -> bool:
+    return any(
+        count > 0 for (_, status), count in
+        Calculation.count_by_status().items()
+        if status in statuses
+    )
+
+
+class Worker(ABC):
+    def __init__(
+        self,
+        name: str,
+        fetch_time: Union[int, Tuple[int, int]] = None,
+        backoff_time: Tuple[int, int] = None
+    ):
+        self.name = name
+        if fetch_time is None:
+            fetch_time = config.fetch_time
+        if backoff_time is None:
+            backoff_time = config.backoff_time
+
+        self.fetch_time = fetch_time
+        self.backoff_time = backoff_time
+
+        self.queue = get_queue(name)
+
+        self.failures = 0
+        self.last_sweep: Optional[datetime] = None
+        self.last_error: Optional[datetime] = None
+        self.last_reconcile: Optional[datetime] = None
+        self.interval: Optional[float] = None
+
+        workers[name] = self
+
+    @abstractmethod
+    async def sweep(self):
+        pass
+
+    async def reconcile(self):
+        pass
+
+    def is_reconcile_due(self) -> bool:
+        if self.last_reconcile is None:
+            return True
+        return datetime.utcnow() - self.last_reconcile >= timedelta(
+            seconds=config.reconcile_time)
+
+    def get_delay(self) -> float:
+        if self.failures == 0:
+            return get_fetch_time(self.fetch_time)
+
+        base, limit = self.backoff_time
+        delay = min(base * 2 ** (self.failures - 1), limit)
+        return uniform(delay / 2, delay)
+
+    async def run(self):
+        while True:
+            try:
+                with connection_scope():
+                    if self.is_reconcile_due():
+                        await self.reconcile()
+                        self.last_reconcile = datetime.utcnow()
+
+                    await self.sweep()
+                self.failures = 0
+                self.last_sweep = datetime.utcnow()
+
+            except asyncio.CancelledError:
+                raise
+
+            except Exception as e:
+                self.failures += 1
+                self.last_error = datetime.utcnow()
+                logging.error(
+                    f'Error while handling updates of {self.name} '
+                    f'({self.failures} in a row)',
+                    exc_info=e
+                )
+
+            self.interval = self.get_delay()
+            if self.failures > 0:
+                await asyncio.sleep(self.interval)
+            else:
+                await self.queue.wait(self.interval)
+
+
+class ClusterWorker(Worker):
+    def __init__(self, cluster: Cluster):
+        super().__init__(cluster.label, cluster.fetch_time)
+        self.cluster = cluster
+        self.next_poll = datetime.utcnow()
+        self.next_sync = datetime.utcnow()
+        self.fast_polls = 0
+
+    def get_delay(self) -> float:
+        if self.failures > 0:
+            return super().get_delay()
+
+        wakeup = self.next_poll
+        if self.cluster.sync_time is not None:
+            wakeup = min(wakeup, self.next_sync)
+        return max(0, (wakeup - datetime.utcnow()).total_seconds())
+
+    def get_poll_interval(self, time_left: Optional[int]) -> float:
+        # Rare polls without work, fast ones right after submissions
+        # and shortly after the earliest expected finish
+        if not self.queue.get(*ACTIVE_STATUSES):
+            return config.idle_fetch_time
+
+        interval = get_fetch_time(self.fetch_time)
+        if self.fast_polls > 0:
+            self.fast_polls -= 1
+            interval = min(interval, config.fast_fetch_time)
+        if time_left is not None:
+            interval = min(
+                interval,
+                max(time_left + config.fast_fetch_time,
+                    config.fast_fetch_time)
+            )
+        return interval
+
+    async def reconcile(self):
+        # Rows are loaded only for statuses that have any calculations
+        counts = Calculation.count_by_status(self.cluster.label)
+        statuses = [
+            status for (_, status), count in counts.items()
+            if count > 0 and (
+                status < CalculationStatus.FINISHED_OK or
+                status.is_finished()
+            )
+        ]
+        if statuses:
+            self.queue.put(*Calculation.get_by_statuses(
+                statuses, self.cluster.label))
+
+    async def sweep(self):
+        await upload_calculations(
+            self.cluster,
+            self.queue.get(CalculationStatus.NOT_STARTED)
+        )
+        started = await start_calculations(
+            self.cluster,
+            self.queue.get(CalculationStatus.UPLOADED)
+        )
+
+        if started:
+            self.fast_polls = FAST_POLLS
+            self.next_poll = min(self.next_poll, datetime.utcnow() + timedelta(
+                seconds=config.fast_fetch_time))
+
+        if datetime.utcnow() >= self.next_poll:
+            _, time_left = await check_updates(self.cluster, self.queue.get(
+                CalculationStatus.PENDING,
+                CalculationStatus.RUNNING
+            ))
+            self.next_poll = datetime.utcnow() + timedelta(
+                seconds=self.get_poll_interval(time_left))
+
+        if (
+            self.cluster.sync_time is not None and
+            datetime.utcnow() >= self.next_sync
+        ):
+            await sync_running(
+                self.cluster,
+                self.queue.get(CalculationStatus.RUNNING)
+            )
+            self.next_sync = datetime.utcnow() + timedelta(
+                seconds=self.cluster.sync_time)
+
+        loaded = await load_finished(
+            self.cluster,
+            self.queue.get(*CalculationStatus.get_finished())
+        )
+        self.queue.remove(*loaded)
+        get_queue(STORAGE_QUEUE).put(*loaded)
+
+
+class StorageWorker(Worker):
+    def __init__(self):
+        super().__init__(STORAGE_QUEUE)
+
+    async def reconcile(self):
+        if has_calculations(CalculationStatus.LOADED):
+            self.queue.put(*Calculation.get_by_status(
+                CalculationStatus.LOADED))
+
+    async def sweep(self):
+        clouded = await send_to_cloud(
+            self.queue.get(CalculationStatus.LOADED))
+        self.queue.remove(*clouded)
+        get_queue(NOTIFICATION_QUEUE).put(*clouded)
+
+
+class PlacementWorker(Worker):
+    def __init__(self, clusters: List[Cluster]):
+        super().__init__('placement', config.placement.refresh_time)
+        self.clusters = clusters
+
+    async def sweep(self):
+        for cluster in self.clusters:
+            try:
+                snapshot = await config.executor.run_on_cluster(
+                    cluster, get_load, cluster)
+            except Exception as e:
+                # Stale snapshots fall back to the config order
+                logging.warning(
+                    f'Failed to get load of {cluster.label}', exc_info=e)
+                continue
+            config.placement.update(cluster.label, snapshot)
+
+
+class HandoffWorker(Worker):
+    # Other instances of the bot only save new calculations to the
+    # database, they are taken from there without waiting for reconcile
+    def __init__(self, clusters: List[Cluster], fetch_time: int):
+        super().__init__('handoff', fetch_time)
+        self.labels = {cluster.label for cluster in clusters}
+
+    async def sweep(self):
+        counts = {}
+        for (label, status), count in Calculation.count_by_status().items():
+            if label in self.labels and status in HANDOFF_STATUSES:
+                counts[label] = counts.get(label, 0) + count
+
+        for label, count in counts.items():
+            queue = get_queue(label)
+            if count <= len(queue.get(*HANDOFF_STATUSES)):
+                continue
+
+            queue.put(*[
+                calculation for calculation in
+                Calculation.get_by_statuses(HANDOFF_STATUSES, label)
+                if calculation not in queue
+            ])
+
+
+workers: Dict[str, Worker] = {}
+
+
+async def restart_after_delay(worker: Worker):
+    await asyncio.sleep(worker.get_delay())
+    await worker.run()
+
+
+async def supervise(workers: List[Worker]):
+    tasks = {asyncio.ensure_future(w.run()): w for w in workers}
+
+    try:
+        while tasks:
+            done, _ = await asyncio.wait(
+                tasks,
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                worker = tasks.pop(task)
+                if task.cancelled():
+                    continue
+
+                error = task.exception()
+                if error is None:
+                    logging.warning(
+                        f'Worker {worker.name} returned, restarting')
+                else:
+                    worker.failures += 1
+                    worker.last_error = datetime.utcnow()
+                    logging.error(
+                        f'Worker {worker.name} crashed, restarting',
+                        exc_info=error
+                    )
+                tasks[asyncio.ensure_future(
+                    restart_after_delay(worker))] = worker
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
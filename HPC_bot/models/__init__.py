@@ -1,4 +1,4 @@
-from .base_model import db
+from .base_model import db, connection_scope
 from .organization import Organization
 from .person import Person
 from .user import User
@@ -0,0 +1,106 @@
+from datetime import datetime
+from typing import Any, Callable, List, Optional
+
+from .base_model import connection_scope
+from .calculation import Calculation
+from .person import Person
+from .telegram_user import TelegramUser
+from .user import User
+from . import manager
+from ..utils import config
+
+
+# Coroutines for the bot handlers: queries run in the database threads of
+# the executor, so a slow query does not stall the event loop. Results are
+# fully loaded, relations used by the handlers are joined in advance
+
+
+def scoped(func: Callable, *args, **kwargs) -> Any:
+    with connection_scope():
+        return func(*args, **kwargs)
+
+
+async def run(name: str, func: Callable, *args, **kwargs) -> Any:
+    return await config.executor.run_db(name, scoped, func, *args, **kwargs)
+
+
+async def authenticate(
+    tg_id: int,
+    no_throw: bool = False,
+    apply_join: bool = False
+) -> Optional[TelegramUser]:
+    return await run(
+        'authenticate', TelegramUser.authenticate, tg_id, no_throw, apply_join)
+
+
+async def register(tg_id: int, first_name: str, last_name: str):
+    return await run(
+        'register', TelegramUser.register, tg_id, first_name, last_name)
+
+
+async def new_calculation(**kwargs) -> Calculation:
+    return await run('new_calculation', Calculation.new_calculation, **kwargs)
+
+
+async def update_person(person: Person, **kwargs):
+    return await run('update_person', person.update_from_raw_data, **kwargs)
+
+
+def get_joined_tg_user(user: Optional[User]) -> Optional[TelegramUser]:
+    if user is None:
+        return None
+
+    return (
+        TelegramUser.select(TelegramUser, User, Person)
+        .join(User)
+        .join(Person)
+        .where(User.id == user.id)
+        .get()
+    )
+
+
+def change_user(change: Callable[[int], Optional[User]], idx: int):
+    return get_joined_tg_user(change(idx))
+
+
+async def approve_user(idx: int) -> Optional[TelegramUser]:
+    return await run('approve_user', change_user, User.approve, idx)
+
+
+async def block_user(idx: int) -> Optional[TelegramUser]:
+    return await run('block_user', change_user, User.block, idx)
+
+
+async def unblock_user(idx: int) -> Optional[TelegramUser]:
+    return await run('unblock_user', change_user, User.unblock, idx)
+
+
+def save_calculation_limit(user: User, limit: int):
+    user.calculation_limit = limit
+    user.save()
+
+
+async def set_calculation_limit(user: User, limit: int):
+    await run('set_calculation_limit', save_calculation_limit, user, limit)
+
+
+async def get_all_with_calcs(
+    since: datetime = None,
+    remove_blocked: bool = False
+) -> List[TelegramUser]:
+    return await run('get_all_with_calcs', lambda: list(
+        manager.get_all_with_calcs(since, remove_blocked)))
+
+
+async def search_users(**kwargs) -> List[TelegramUser]:
+    return await run('search_users', lambda: list(
+        manager.search_users(**kwargs)))
+
+
+async def get_tg_user(**kwargs) -> Optional[TelegramUser]:
+    return await run('get_tg_user', manager.get_tg_user, **kwargs)
+
+
+async def get_tg_user_with_calcs(**kwargs) -> Optional[TelegramUser]:
+    return await run(
+        'get_tg_user_with_calcs', manager.get_tg_user_with_calcs, **kwargs)
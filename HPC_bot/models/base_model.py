@@ -1,30 +1,112 @@
 import logging
+import threading
+from contextlib import contextmanager
 from peewee import PostgresqlDatabase, Model, SqliteDatabase, MySQLDatabase
+from peewee import Database as PeeweeDatabase
+from peewee import InterfaceError, OperationalError
+from playhouse.pool import PooledDatabase
+from playhouse.pool import PooledMySQLDatabase, PooledPostgresqlDatabase
+from playhouse.shortcuts import ReconnectMixin
 
-from ..hpc import DatabaseTypes
+from ..hpc import Database, DatabaseTypes
 from ..utils import config
 
 
-parameters = {
-    'database': config.db.name,
-    'host': config.db.connection.host,
-    'port': config.db.connection.port,
-    'user': config.db.connection.user,
-    'password': config.db.connection.password.get_secret_value()
-}
-
-if config.db.db_type == DatabaseTypes.SQLITE:
-    logging.warning('DB type is SQLite. Do not use it in production')
-    db = SqliteDatabase(config.db.name)
-elif config.db.db_type == DatabaseTypes.MYSQL:
-    logging.info('DB type is MySQL')
-    db = MySQLDatabase(charset='utf8', **parameters)
-else:
-    if config.db.db_type != DatabaseTypes.POSTGRESQL:
+class ReconnectMySQLDatabase(ReconnectMixin, MySQLDatabase):
+    pass
+
+
+class ReconnectPooledMySQLDatabase(ReconnectMixin, PooledMySQLDatabase):
+    pass
+
+
+class PostgresqlReconnectMixin(ReconnectMixin):
+    reconnect_errors = (
+        (OperationalError, 'terminat'),
+        (OperationalError, 'server closed the connection'),
+        (InterfaceError, 'connection already closed'),
+    )
+
+
+class ReconnectPostgresqlDatabase(
+    PostgresqlReconnectMixin,
+    PostgresqlDatabase
+):
+    pass
+
+
+class ReconnectPooledPostgresqlDatabase(
+    PostgresqlReconnectMixin,
+    PooledPostgresqlDatabase
+):
+    pass
+
+
+def create_database(settings: Database) -> PeeweeDatabase:
+    parameters = {
+        'database': settings.name,
+        'host': settings.connection.host,
+        'port': settings.connection.port,
+        'user': settings.connection.user,
+        'password': (
+            settings.connection.password.get_secret_value()
+            if settings.connection.password is not None else None
+        )
+    }
+    pool = {
+        'max_connections': settings.max_connections,
+        'stale_timeout': settings.stale_timeout,
+        'timeout': settings.pool_timeout,
+    }
+
+    if settings.db_type == DatabaseTypes.SQLITE:
+        logging.warning('DB type is SQLite. Do not use it in production')
+        # One connection per thread, WAL lets readers work during writes
+        return SqliteDatabase(settings.name, pragmas=settings.pragmas)
+
+    if settings.db_type == DatabaseTypes.MYSQL:
+        logging.info('DB type is MySQL')
+        if settings.pooled:
+            return ReconnectPooledMySQLDatabase(
+                charset='utf8', **parameters, **pool)
+        return ReconnectMySQLDatabase(charset='utf8', **parameters)
+
+    if settings.db_type != DatabaseTypes.POSTGRESQL:
         logging.warning('Unrecognized db type, selecting PostgreSQL')
     else:
         logging.info('DB type is PostgreSQL')
-    db = PostgresqlDatabase(**parameters)
+    if settings.pooled:
+        return ReconnectPooledPostgresqlDatabase(**parameters, **pool)
+    return ReconnectPostgresqlDatabase(**parameters)
+
+
+db = create_database(config.db)
+
+_scopes = threading.local()
+
+
+@contextmanager
+def connection_scope(database: PeeweeDatabase = db):
+    # Pooled connection is returned when the last of overlapping scopes
+    # (e.g. concurrent handlers in the event loop thread) is left.
+    # Other databases keep their connection, in-memory SQLite would be
+    # lost otherwise
+    if not isinstance(database, PooledDatabase):
+        yield
+        return
+
+    depths = _scopes.__dict__.setdefault('depths', {})
+    depths[id(database)] = depths.get(id(database), 0) + 1
+    try:
+        yield
+    finally:
+        depths[id(database)] -= 1
+        if (
+            depths[id(database)] == 0 and
+            not database.is_closed() and
+            not database.in_transaction()
+        ):
+            database.close()
 
 
 class BaseDBModel(Model):
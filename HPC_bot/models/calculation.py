@@ -1,7 +1,8 @@
 from datetime import datetime
 import os
-from typing import List, Tuple
+from typing import Dict, List, Optional, Tuple
 from peewee import CharField, ForeignKeyField, DateTimeField, IntegerField
+from peewee import BigIntegerField, fn
 from enum import Enum
 
 from .base_model import BaseDBModel
@@ -19,6 +20,9 @@ class CalculationStatus(Enum):
     RUNNING = 50
 
     FINISHED_OK = 100
+    FAILED = 101
+    TIMEOUT = 102
+    CANCELLED = 103
     FAILED_TO_UPLOAD = 110
 
     LOADED = 200
@@ -26,13 +30,20 @@ class CalculationStatus(Enum):
     SENDED = 1000
 
     @staticmethod
-    def from_slurm(status: str) -> 'CalculationStatus':
-        if status == 'PD':
-            return CalculationStatus.PENDING
-        if status == 'R':
-            return CalculationStatus.RUNNING
+    def from_slurm(status: str) -> Optional['CalculationStatus']:
+        return SLURM_STATES.get(status)
 
-        return CalculationStatus.FINISHED_OK
+    @staticmethod
+    def get_finished() -> List['CalculationStatus']:
+        return [
+            CalculationStatus.FINISHED_OK,
+            CalculationStatus.FAILED,
+            CalculationStatus.TIMEOUT,
+            CalculationStatus.CANCELLED,
+        ]
+
+    def is_finished(self) -> bool:
+        return self in CalculationStatus.get_finished()
 
     def __lt__(self, other):
         return self.value < other.value
@@ -47,6 +58,32 @@ class CalculationStatus(Enum):
         return self.value <= other.value
 
 
+# Compact squeue state codes, unknown ones leave the status as is
+SLURM_STATES = {
+    'PD': CalculationStatus.PENDING,
+    'CF': CalculationStatus.PENDING,
+    'RQ': CalculationStatus.PENDING,
+    'RF': CalculationStatus.PENDING,
+    'RD': CalculationStatus.PENDING,
+    'R': CalculationStatus.RUNNING,
+    'CG': CalculationStatus.RUNNING,
+    'S': CalculationStatus.RUNNING,
+    'ST': CalculationStatus.RUNNING,
+    'SO': CalculationStatus.RUNNING,
+    'SI': CalculationStatus.RUNNING,
+    'RS': CalculationStatus.RUNNING,
+    'CD': CalculationStatus.FINISHED_OK,
+    'F': CalculationStatus.FAILED,
+    'NF': CalculationStatus.FAILED,
+    'BF': CalculationStatus.FAILED,
+    'OOM': CalculationStatus.FAILED,
+    'PR': CalculationStatus.FAILED,
+    'TO': CalculationStatus.TIMEOUT,
+    'DL': CalculationStatus.TIMEOUT,
+    'CA': CalculationStatus.CANCELLED,
+}
+
+
 class SubmitType(Enum):
     TELEGRAM = 0
 
@@ -66,6 +103,14 @@ class Calculation(BaseDBModel):
     start_datetime = DateTimeField()
     end_datetime = DateTimeField(null=True)
     slurm_id = IntegerField(null=True)
+    array_task_id = IntegerField(null=True)
+
+    # Accounting from sacct, filled once the job leaves the queue
+    slurm_state = CharField(32, null=True)
+    exit_code = CharField(16, null=True)
+    elapsed = IntegerField(null=True)
+    cpu_time = BigIntegerField(null=True)
+    max_rss = BigIntegerField(null=True)
 
     status = IntegerField(choices=[(e.value, e.name)
                           for e in CalculationStatus])
@@ -80,6 +125,15 @@ class Calculation(BaseDBModel):
         backref='calculations'
     )
 
+    class Meta:
+        # Access paths of the workers, notifications and monthly limits
+        indexes = (
+            (('status',), False),
+            (('cluster', 'status'), False),
+            (('user', 'start_datetime'), False),
+            (('slurm_id',), False),
+        )
+
     @staticmethod
     def new_calculation(
         name: str,
@@ -93,28 +147,33 @@ class Calculation(BaseDBModel):
             raise BlockedException(
                 f'User #{user.id} is blocked'
             )
-        if len(user.get_calculations(
-            get_month_start())
-        ) >= user.calculation_limit:
-
-            raise CalculationLimitExceeded(
-                f'User #{user.id} exceeded its calculation limit'
+        with Calculation._meta.database.atomic():
+            # Writing the user row locks it till the end of the transaction,
+            # so concurrent submissions of one user are counted one by one
+            User.update(calculation_limit=User.calculation_limit).where(
+                User.id == user.id
+            ).execute()
+            if user.count_calculations(
+                get_month_start()
+            ) >= user.calculation_limit:
+                raise CalculationLimitExceeded(
+                    f'User #{user.id} exceeded its calculation limit'
+                )
+
+            cluster_model, _ = Cluster.get_or_create(
+                label=cluster.label,
+                defaults={'name': cluster.label}
             )
 
-        cluster_model, _ = Cluster.get_or_create(
-            label=cluster.label,
-            defaults={'name': cluster.label}
-        )
-
-        return Calculation.create(
-            name=name,
-            command=command,
-            start_datetime=datetime.utcnow(),
-            user=user,
-            cluster=cluster_model,
-            status=CalculationStatus.NOT_STARTED.value,
-            submit_type=submit_type.value
-        )
+            return Calculation.create(
+                name=name,
+                command=command,
+                start_datetime=datetime.utcnow(),
+                user=user,
+                cluster=cluster_model,
+                status=CalculationStatus.NOT_STARTED.value,
+                submit_type=submit_type.value
+            )
 
     @staticmethod
     def get_all() -> List['Calculation']:
@@ -133,8 +192,8 @@ class Calculation(BaseDBModel):
         )
 
     @staticmethod
-    def get_unfinished() -> List['Calculation']:
-        return (
+    def get_unfinished(cluster_label: str = None) -> List['Calculation']:
+        select = (
             Calculation.select(Calculation, Cluster, User)
             .join(Cluster)
             .switch(Calculation)
@@ -143,10 +202,16 @@ class Calculation(BaseDBModel):
                 Calculation.status < CalculationStatus.FINISHED_OK.value
             )
         )
+        if cluster_label is not None:
+            select = select.where(Cluster.label == cluster_label)
+        return select
 
     @staticmethod
-    def get_by_status(status: CalculationStatus) -> List['Calculation']:
-        return (
+    def get_by_status(
+        status: CalculationStatus,
+        cluster_label: str = None
+    ) -> List['Calculation']:
+        select = (
             Calculation.select(Calculation, Cluster, User)
             .join(Cluster)
             .switch(Calculation)
@@ -155,6 +220,52 @@ class Calculation(BaseDBModel):
                 Calculation.status == status.value
             )
         )
+        if cluster_label is not None:
+            select = select.where(Cluster.label == cluster_label)
+        return select
+
+    def get_job_key(self) -> Tuple[int, Optional[int]]:
+        return self.slurm_id, self.array_task_id
+
+    @staticmethod
+    def get_by_statuses(
+        statuses: List[CalculationStatus],
+        cluster_label: str = None
+    ) -> List['Calculation']:
+        select = (
+            Calculation.select(Calculation, Cluster, User)
+            .join(Cluster)
+            .switch(Calculation)
+            .join(User)
+            .where(
+                Calculation.status.in_([s.value for s in statuses])
+            )
+        )
+        if cluster_label is not None:
+            select = select.where(Cluster.label == cluster_label)
+        return select
+
+    @staticmethod
+    def count_by_status(
+        cluster_label: str = None
+    ) -> Dict[Tuple[str, CalculationStatus], int]:
+        # One cheap grouped query, so idle sweeps can skip loading rows
+        select = (
+            Calculation.select(
+                Cluster.label,
+                Calculation.status,
+                fn.COUNT(Calculation.id).alias('count')
+            )
+            .join(Cluster)
+            .group_by(Cluster.label, Calculation.status)
+        )
+        if cluster_label is not None:
+            select = select.where(Cluster.label == cluster_label)
+
+        return {
+            (label, CalculationStatus(status)): count
+            for label, status, count in select.tuples()
+        }
 
     def get_status(self) -> CalculationStatus:
         return CalculationStatus(self.status)
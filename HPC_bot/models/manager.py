@@ -101,7 +101,8 @@ def get_tg_user_with_calcs(
             User,
             Person,
             Organization,
-            fn.COUNT(calculations.c.id).alias('num_calc')
+            fn.COUNT(calculations.c.id).alias('num_calc'),
+            fn.COALESCE(fn.SUM(calculations.c.cpu_time), 0).alias('cpu_time')
         )
         .join(User)
         .join(Person)
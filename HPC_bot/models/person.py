@@ -3,6 +3,7 @@ from peewee import CharField, ForeignKeyField, BooleanField
 
 from .base_model import BaseDBModel
 from .organization import Organization
+from ..utils import config
 
 
 class Person(BaseDBModel):
@@ -54,5 +55,6 @@ class Person(BaseDBModel):
             self.approved = False
 
             self.save()
+            config.bot.auth_cache.invalidate(person_id=self.id)
 
         return tuple(result)
@@ -1,8 +1,9 @@
-from peewee import BigIntegerField, ForeignKeyField, DoesNotExist, JOIN
+from peewee import BigIntegerField, ForeignKeyField
 
 from .base_model import BaseDBModel
 from .user import User
 from .person import Person
+from ..utils import config
 
 
 class UnauthorizedAccessError(Exception):
@@ -23,21 +24,18 @@ class TelegramUser(BaseDBModel):
     @staticmethod
     def authenticate(tg_id: int, no_throw: bool = False,
                      apply_join: bool = False) -> 'TelegramUser':
-        try:
-            if not apply_join:
-                user = TelegramUser.get_by_id(tg_id)
-            else:
-                users = (TelegramUser.select(TelegramUser, User, Person)
-                         .join(User)
-                         .join(Person)
-                         .where(TelegramUser.tg_id == tg_id)
-                         )
-                if len(users) == 0:
-                    user = None
-                else:
-                    user = users[0]
-        except DoesNotExist:
-            user = None
+        # Joined rows are cached, unknown users are not
+        user = config.bot.auth_cache.get(tg_id)
+        if user is None and not apply_join:
+            user = TelegramUser.get_or_none(TelegramUser.tg_id == tg_id)
+        elif user is None:
+            user = (TelegramUser.select(TelegramUser, User, Person)
+                    .join(User)
+                    .join(Person)
+                    .where(TelegramUser.tg_id == tg_id)
+                    .get_or_none())
+            if user is not None:
+                config.bot.auth_cache.put(tg_id, user)
 
         if user is None and not no_throw:
             raise UnauthorizedAccessError(
@@ -7,6 +7,7 @@ from peewee import DoesNotExist
 from .base_model import db, BaseDBModel
 from .person import Person
 from .organization import Organization
+from ..utils import config
 
 if TYPE_CHECKING:
     from .calculation import Calculation
@@ -66,6 +67,7 @@ class User(BaseDBModel):
         with db.atomic():
             user.person.save()
             user.save()
+        config.bot.auth_cache.invalidate(user_id=user.id)
 
         return user
 
@@ -81,6 +83,7 @@ class User(BaseDBModel):
 
         user.blocked = True
         user.save()
+        config.bot.auth_cache.invalidate(user_id=user.id)
 
         return user
 
@@ -96,14 +99,22 @@ class User(BaseDBModel):
 
         user.blocked = False
         user.save()
+        config.bot.auth_cache.invalidate(user_id=user.id)
 
         return user
 
+    def count_calculations(self, since: datetime = None) -> int:
+        calculations = self.calculations
+        if since is not None:
+            calculations = calculations.where(
+                calculations.model.start_datetime >= since)
+        return calculations.count()
+
     def get_calculations(self, since: datetime = None) -> List['Calculation']:
         if since is None:
             return self.calculations
 
-        return list(filter(
-            lambda x: x.start_datetime >= since,
-            self.calculations
+        calculations = self.calculations
+        return list(calculations.where(
+            calculations.model.start_datetime >= since
         ))
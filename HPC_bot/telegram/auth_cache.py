@@ -0,0 +1,76 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Optional, Tuple
+from pydantic import BaseModel, Field, PrivateAttr
+
+
+class CacheStats(BaseModel):
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    size: int = 0
+
+    def get_hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0
+
+
+class AuthCache(BaseModel):
+    # Authenticated TelegramUser rows with joined User and Person by tg_id
+    size: int = Field(1000, ge=0)
+    ttl: int = Field(300, ge=0)
+
+    _entries: 'OrderedDict[int, Tuple[float, Any]]' = PrivateAttr(
+        default_factory=OrderedDict)
+    _lock: Lock = PrivateAttr(default_factory=Lock)
+    _stats: CacheStats = PrivateAttr(default_factory=CacheStats)
+
+    def get(self, tg_id: int) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(tg_id)
+            if entry is not None and entry[0] < time.monotonic():
+                del self._entries[tg_id]
+                entry = None
+
+            if entry is None:
+                self._stats.misses += 1
+                return None
+
+            self._entries.move_to_end(tg_id)
+            self._stats.hits += 1
+            return entry[1]
+
+    def put(self, tg_id: int, tg_user: Any):
+        if self.size == 0 or self.ttl == 0:
+            return
+
+        with self._lock:
+            self._entries[tg_id] = (time.monotonic() + self.ttl, tg_user)
+            self._entries.move_to_end(tg_id)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+                self._stats.evictions += 1
+
+    def invalidate(
+        self,
+        tg_id: int = None,
+        user_id: int = None,
+        person_id: int = None
+    ):
+        with self._lock:
+            for key, (_, tg_user) in list(self._entries.items()):
+                if (
+                    key == tg_id or
+                    tg_user.user_id == user_id or
+                    tg_user.user.person_id == person_id
+                ):
+                    del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> CacheStats:
+        with self._lock:
+            return self._stats.model_copy(update={'size': len(self._entries)})
@@ -1,5 +1,8 @@
-from typing import Union
-from pydantic import BaseModel
+from typing import Optional, Union
+from pydantic import BaseModel, Field, model_validator
+
+from .auth_cache import AuthCache
+from .webhook import Webhook
 
 
 class Bot(BaseModel):
@@ -7,5 +10,25 @@ class Bot(BaseModel):
     admin_name: str = '@admin'
     log_chat_id: Union[int, str] = None
     log_chat_level: Union[int, str] = 'INFO'
+    auth_cache: AuthCache = Field(default_factory=AuthCache)
+
+    notify_concurrency: int = Field(8, ge=1)
+    messages_per_second: float = Field(25, gt=0)
+    chat_messages_per_second: float = Field(1, gt=0)
+    group_messages_per_minute: float = Field(20, gt=0)
+    log_digest_time: int = Field(10, ge=0)
+
+    webhook: Optional[Webhook] = None
 
     bot_name: str = None
+
+    @model_validator(mode='after')
+    def validate_auth_cache(self) -> 'Bot':
+        # The cache is not invalidated by other instances, blocks and
+        # new limits set there are seen here only after the ttl
+        if self.webhook is not None and self.webhook.is_shared():
+            self.auth_cache.ttl = min(
+                self.auth_cache.ttl,
+                self.webhook.shared_cache_ttl
+            )
+        return self
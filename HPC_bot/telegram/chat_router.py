@@ -5,7 +5,7 @@ from aiogram.filters import JOIN_TRANSITION, LEAVE_TRANSITION
 
 from .utils import log_message, create_user_link
 from ..utils import config
-from ..models import TelegramUser
+from ..models import async_db
 
 
 chat_router = Router()
@@ -89,13 +89,13 @@ async def left_chat(event: ChatMemberUpdated):
 @chat_router.message(Command(commands=['access']))
 async def register(message: Message):
     user = message.from_user
-    tg_user = TelegramUser.authenticate(user.id, True)
+    tg_user = await async_db.authenticate(user.id, True)
 
     if tg_user is not None:
         await message.reply(ALREADY_GRANTED)
         return
 
-    tg_user = TelegramUser.register(
+    tg_user = await async_db.register(
         tg_id=user.id,
         first_name=user.first_name,
         last_name=user.last_name if user.last_name is not None else ''
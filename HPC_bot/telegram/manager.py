@@ -1,12 +1,16 @@
 import asyncio
 import logging
-from typing import List
+from typing import List, Optional
 from aiogram import Bot
 
-from .utils import log_message, create_user_link
+from .outbox import OutgoingMessage, outbox
+from .utils import create_user_link
 
 from ..utils import config
+from ..hpc.pipeline import NOTIFICATION_QUEUE
+from ..hpc.worker import Worker, has_calculations
 from ..models import db, Calculation, Cluster, CalculationStatus, SubmitType
+from ..models import Person, async_db
 from ..models import User as UserModel
 from ..models import TelegramUser as TelegramUserModel
 
@@ -28,70 +32,143 @@ CALCULATION_FINISHED_LOG = (
 )
 
 
-async def notify_on_finished(bot: Bot):
-    calculations: List[Calculation] = (
+def get_notifications() -> List[Calculation]:
+    # Users, their profiles and Telegram accounts come in the same query
+    calculations: List[Calculation] = list(
         Calculation.select(
-            Calculation, Cluster, UserModel, TelegramUserModel
+            Calculation, Cluster, UserModel, Person, TelegramUserModel
         )
         .join(Cluster).switch(Calculation)
         .join(UserModel)
-        .join(TelegramUserModel)
+        .join(Person).switch(UserModel)
+        .join(TelegramUserModel, attr='telegram')
         .where((
                 (Calculation.status == CalculationStatus.CLOUDED.value) |
                 (Calculation.status == CalculationStatus.FAILED_TO_UPLOAD.value)
             ) & (Calculation.submit_type == SubmitType.TELEGRAM.value))
     )
-    users: List[TelegramUserModel] = [calc.user.tg_user[0]
-                                      for calc in calculations]
+    for calc in calculations:
+        calc.user.telegram.user = calc.user
+    return calculations
 
-    updated = []
-    for calc, user in zip(calculations, users):
-        if calc.get_status() == CalculationStatus.FAILED_TO_UPLOAD:
-            text = CALCULATION_FAILED_TO_UPLOAD.format(
-                name=calc.name
-            )
-            log_text = CALCULATION_FAILED_TO_UPLOAD_LOG.format(
-                user=create_user_link(
-                    model=user
-                ),
-                name=calc.name
-            )
-            calc.set_status(CalculationStatus.SENDED)
-        else:
-            link = config.storage.get_shared(calc.get_folder_name())
-            text = CALCULATION_FINISHED.format(
-                name=calc.name,
-                link=link
-            )
-            log_text = CALCULATION_FINISHED_LOG.format(
-                user=create_user_link(
-                    model=user
-                ),
-                name=calc.name,
-                link=link
-            )
-            calc.set_status(CalculationStatus.SENDED)
 
-        updated.append(calc)
+def save_statuses(calculations: List[Calculation]):
+    with db.atomic():
+        Calculation.bulk_update(
+            calculations,
+            fields=['status']
+        )
 
-        try:
-            message = await bot.send_message(
-                chat_id=user.tg_id,
-                text=text
-            )
-            await log_message(
-                bot=bot,
-                text=log_text
-            )
-        except Exception as e:
+
+async def get_link(calc: Calculation, slots: asyncio.Semaphore) -> str:
+    async with slots:
+        return await config.executor.run(
+            config.storage.get_shared,
+            calc.get_folder_name()
+        )
+
+
+async def notify(
+    calc: Calculation,
+    link: Optional[str],
+    slots: asyncio.Semaphore
+):
+    user: TelegramUserModel = calc.user.telegram
+
+    if calc.get_status() == CalculationStatus.FAILED_TO_UPLOAD:
+        text = CALCULATION_FAILED_TO_UPLOAD.format(
+            name=calc.name
+        )
+        log_text = CALCULATION_FAILED_TO_UPLOAD_LOG.format(
+            user=create_user_link(
+                model=user
+            ),
+            name=calc.name
+        )
+    else:
+        text = CALCULATION_FINISHED.format(
+            name=calc.name,
+            link=link
+        )
+        log_text = CALCULATION_FINISHED_LOG.format(
+            user=create_user_link(
+                model=user
+            ),
+            name=calc.name,
+            link=link
+        )
+
+    async with slots:
+        await outbox.send_now(OutgoingMessage(user.tg_id, text))
+    outbox.log(log_text)
+
+
+async def notify_on_finished(bot: Bot):
+    calculations = await async_db.run(
+        'get_notifications', get_notifications)
+    if len(calculations) == 0:
+        return
+
+    # Links are resolved and messages are sent concurrently, within
+    # Telegram rate limits of the outbox
+    slots = asyncio.Semaphore(config.bot.notify_concurrency)
+
+    links = await asyncio.gather(*[
+        get_link(calc, slots)
+        if calc.get_status() != CalculationStatus.FAILED_TO_UPLOAD
+        else asyncio.sleep(0)
+        for calc in calculations
+    ], return_exceptions=True)
+
+    notifications = []
+    for calc, link in zip(calculations, links):
+        if isinstance(link, Exception):
+            # Stays clouded until the next sweep
             logging.error(
-                'Failed to send message to user #{id}'.format(id=user.id),
-                exc_info=e
+                f'Failed to get link of calculation #{calc.id}',
+                exc_info=link
             )
+            continue
+        notifications.append((calc, link))
 
-    if len(updated) > 0:
-        with db.atomic():
-            Calculation.bulk_update(
-                updated,
-                fields=['status']
+    # Messages are not queued in the outbox: a status is saved only after
+    # its message is delivered, so a restart does not lose notifications
+    results = await asyncio.gather(*[
+        notify(calc, link, slots) for calc, link in notifications
+    ], return_exceptions=True)
+
+    updated = []
+    for (calc, _), result in zip(notifications, results):
+        if isinstance(result, Exception):
+            logging.error(
+                f'Failed to notify about calculation #{calc.id}',
+                exc_info=result
             )
+            continue
+        calc.set_status(CalculationStatus.SENDED)
+        updated.append(calc)
+    if len(updated) > 0:
+        await async_db.run('save_statuses', save_statuses, updated)
+
+
+class NotificationWorker(Worker):
+    def __init__(self, bot: Bot):
+        super().__init__(NOTIFICATION_QUEUE)
+        self.bot = bot
+        self.pending = True
+
+    async def reconcile(self):
+        self.pending = await async_db.run(
+            'has_calculations',
+            has_calculations,
+            CalculationStatus.CLOUDED,
+            CalculationStatus.FAILED_TO_UPLOAD
+        )
+
+    async def sweep(self):
+        if not self.pending and len(self.queue) == 0:
+            return
+
+        self.queue.clear()
+        self.pending = False
+        await notify_on_finished(self.bot)
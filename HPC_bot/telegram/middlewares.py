@@ -0,0 +1,32 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from ..models import connection_scope
+
+
+class DatabaseMiddleware(BaseMiddleware):
+    # Every update holds a pooled connection only while it is handled
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        with connection_scope():
+            return await handler(event, data)
+
+
+class ConcurrencyMiddleware(BaseMiddleware):
+    def __init__(self, limit: int):
+        self.slots = asyncio.Semaphore(limit)
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        async with self.slots:
+            return await handler(event, data)
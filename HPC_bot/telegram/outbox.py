@@ -0,0 +1,227 @@
+import asyncio
+import itertools
+import logging
+from collections import deque
+from enum import IntEnum
+from typing import Deque, Dict, List, Optional, Union
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+
+from .rate_limit import TokenBucket
+from ..utils import config
+
+
+RETRY_ATTEMPTS = 3
+MESSAGE_LENGTH = 4096
+DIGEST_SEPARATOR = '\n\n'
+MAX_CHAT_BUCKETS = 1000
+
+ChatId = Union[int, str]
+
+
+class Priority(IntEnum):
+    USER = 0
+    LOG = 1
+
+
+class OutgoingMessage:
+    def __init__(
+        self,
+        chat_id: ChatId,
+        text: str,
+        document: str = None,
+        priority: Priority = Priority.USER
+    ):
+        self.chat_id = chat_id
+        self.text = text
+        self.document = document
+        self.priority = priority
+
+
+def is_private(chat_id: ChatId) -> bool:
+    return isinstance(chat_id, int) and chat_id > 0
+
+
+def split_digest(entries: List[str]) -> List[str]:
+    messages = []
+    current = ''
+    for entry in entries:
+        entry = entry[:MESSAGE_LENGTH]
+        if current and len(current) + len(DIGEST_SEPARATOR) + len(
+                entry) > MESSAGE_LENGTH:
+            messages.append(current)
+            current = ''
+        current = f'{current}{DIGEST_SEPARATOR}{entry}' if current else entry
+    if current:
+        messages.append(current)
+    return messages
+
+
+class Outbox:
+    # Handlers enqueue messages and return, senders deliver them within
+    # per-chat and global Telegram limits, replies to users go first
+    def __init__(self):
+        self.queue: Optional[asyncio.PriorityQueue] = None
+        self.order = itertools.count()
+        self.digest: List[str] = []
+
+        self.bot: Optional[Bot] = None
+        self.tasks: List[asyncio.Task] = []
+        self.bucket: Optional[TokenBucket] = None
+        self.chat_buckets: Dict[ChatId, TokenBucket] = {}
+        self.chat_pending: Dict[ChatId, Deque[OutgoingMessage]] = {}
+
+        self.sent = 0
+        self.failed = 0
+        self.throttled = 0
+
+    def get_queue(self) -> asyncio.PriorityQueue:
+        if self.queue is None:
+            self.queue = asyncio.PriorityQueue()
+        return self.queue
+
+    def put(self, message: OutgoingMessage):
+        self.get_queue().put_nowait(
+            (message.priority, next(self.order), message))
+
+    def send(self, chat_id: ChatId, text: str):
+        self.put(OutgoingMessage(chat_id, text))
+
+    def log(self, text: str, document: str = None):
+        if config.bot.log_chat_id is None:
+            return
+
+        if document is not None:
+            self.put(OutgoingMessage(
+                config.bot.log_chat_id, text, document, Priority.LOG))
+        elif config.bot.log_digest_time == 0:
+            self.put(OutgoingMessage(
+                config.bot.log_chat_id, text, priority=Priority.LOG))
+        else:
+            self.digest.append(text)
+
+    def flush_digest(self):
+        if not self.digest or config.bot.log_chat_id is None:
+            self.digest = []
+            return
+
+        entries, self.digest = self.digest, []
+        for text in split_digest(entries):
+            self.put(OutgoingMessage(
+                config.bot.log_chat_id, text, priority=Priority.LOG))
+
+    def get_chat_bucket(self, chat_id: ChatId) -> TokenBucket:
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self.chat_buckets) >= MAX_CHAT_BUCKETS:
+                self.prune_chats()
+            if is_private(chat_id):
+                bucket = TokenBucket(config.bot.chat_messages_per_second)
+            else:
+                bucket = TokenBucket(
+                    config.bot.group_messages_per_minute / 60,
+                    capacity=1
+                )
+            self.chat_buckets[chat_id] = bucket
+        return bucket
+
+    def prune_chats(self):
+        # Chats with full buckets behave the same as new ones
+        for chat_id, bucket in list(self.chat_buckets.items()):
+            if chat_id not in self.chat_pending and bucket.get_delay() == 0:
+                del self.chat_buckets[chat_id]
+
+    async def deliver(self, message: OutgoingMessage):
+        if message.document is not None:
+            await self.bot.send_document(
+                message.chat_id,
+                document=message.document,
+                caption=message.text
+            )
+        else:
+            await self.bot.send_message(message.chat_id, message.text)
+
+    async def send_now(self, message: OutgoingMessage):
+        chat_bucket = self.get_chat_bucket(message.chat_id)
+        for attempt in range(RETRY_ATTEMPTS):
+            await chat_bucket.acquire()
+            await self.bucket.acquire()
+            try:
+                await self.deliver(message)
+                self.sent += 1
+                return
+            except TelegramRetryAfter as e:
+                self.throttled += 1
+                if attempt == RETRY_ATTEMPTS - 1:
+                    raise
+                logging.warning(
+                    f'Flood limit for chat {message.chat_id}, '
+                    f'retrying after {e.retry_after} s'
+                )
+                await asyncio.sleep(e.retry_after)
+
+    async def send_safely(self, message: OutgoingMessage):
+        try:
+            await self.send_now(message)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.failed += 1
+            logging.error(
+                f'Failed to send message to chat {message.chat_id}',
+                exc_info=e
+            )
+
+    async def run_sender(self):
+        queue = self.get_queue()
+        while True:
+            _, _, message = await queue.get()
+
+            # One sender per chat keeps the order of its messages, and a
+            # slow chat does not hold other senders
+            pending = self.chat_pending.get(message.chat_id)
+            if pending is not None:
+                pending.append(message)
+                continue
+
+            pending = deque([message])
+            self.chat_pending[message.chat_id] = pending
+            try:
+                while pending:
+                    await self.send_safely(pending[0])
+                    pending.popleft()
+                    queue.task_done()
+            finally:
+                del self.chat_pending[message.chat_id]
+
+    async def run_digest(self):
+        while True:
+            await asyncio.sleep(config.bot.log_digest_time or 1)
+            self.flush_digest()
+
+    def start(self, bot: Bot):
+        self.bot = bot
+        self.bucket = TokenBucket(config.bot.messages_per_second)
+        self.tasks = [
+            asyncio.ensure_future(self.run_sender())
+            for _ in range(config.bot.notify_concurrency)
+        ]
+        self.tasks.append(asyncio.ensure_future(self.run_digest()))
+
+    async def stop(self, timeout: float = 10):
+        self.flush_digest()
+        try:
+            await asyncio.wait_for(self.get_queue().join(), timeout)
+        except asyncio.TimeoutError:
+            logging.warning(
+                f'{self.get_queue().qsize()} messages were not sent')
+
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        self.queue = None
+        self.chat_pending = {}
+
+
+outbox = Outbox()
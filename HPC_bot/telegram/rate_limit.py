@@ -0,0 +1,34 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity,
+            self.tokens + (now - self.updated) * self.rate
+        )
+        self.updated = now
+
+    def get_delay(self) -> float:
+        self.refill()
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    async def acquire(self):
+        # No awaits between the check and the decrement, so concurrent
+        # coroutines of one event loop cannot take the same token
+        while True:
+            delay = self.get_delay()
+            if delay == 0:
+                self.tokens -= 1
+                return
+            await asyncio.sleep(delay)
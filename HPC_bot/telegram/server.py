@@ -0,0 +1,52 @@
+from datetime import datetime
+from typing import Any, Dict
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
+from aiogram.webhook.aiohttp_server import setup_application
+from aiohttp import web
+
+from .middlewares import ConcurrencyMiddleware
+from .webhook import Webhook
+
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+def create_app(dp: Dispatcher, bot: Bot, webhook: Webhook) -> web.Application:
+    # Updates are handled in background tasks, at most max_concurrency of
+    # them at once, so Telegram gets its response immediately
+    dp.update.outer_middleware(ConcurrencyMiddleware(webhook.max_concurrency))
+
+    app = web.Application()
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        handle_in_background=True,
+        secret_token=webhook.get_secret()
+    ).register(app, path=webhook.path)
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+def make_message_update(
+    update_id: int,
+    user_id: int,
+    text: str
+) -> Dict[str, Any]:
+    # Minimal private message update, used to test the webhook locally
+    user = {
+        'id': user_id,
+        'is_bot': False,
+        'first_name': 'Test',
+        'username': f'test_{user_id}',
+    }
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(datetime.utcnow().timestamp()),
+            'chat': {'id': user_id, 'type': 'private', 'first_name': 'Test'},
+            'from': user,
+            'text': text,
+        },
+    }
@@ -1,20 +1,22 @@
 from datetime import datetime, timedelta
 import os
 import re
+from functools import partial
 from aiogram import Router, Bot
 from aiogram.types import Message, User as AioUser, Document
 from aiogram.filters import CommandStart, Command, CommandObject
 from aiogram import F
 
+from .outbox import outbox
 from .utils import log_message, create_user_link, get_str_from_re
 from ..utils import config, get_month_start
 from ..models import TelegramUser, UnauthorizedAccessError, Person
-from ..models import User as UserModel
-from ..models.manager import (get_all_with_calcs, get_tg_user_with_calcs,
-                              get_tg_user, search_users)
-from ..hpc.manager import create_calculation_path, start_calculation
+from ..models import async_db
+from ..hpc.manager import create_calculation_path, stream_to_cluster
 from ..hpc.manager import select_cluster
-from ..models import SubmitType, Calculation
+from ..hpc.pipeline import submit
+from ..hpc.worker import workers
+from ..models import SubmitType
 from ..models import CalculationLimitExceeded, BlockedException
 
 
@@ -181,7 +183,8 @@ LIST_USERS = (
 )
 USER_STATUS = (
     'Пользователь {user} из организации {organization}\n'
-    'Месячный лимит расчётов: {limit}, израсходовано {used}'
+    'Месячный лимит расчётов: {limit}, израсходовано {used}\n'
+    'Использовано процессорного времени: {core_hours:.1f} ядро-часов'
 )
 STATUS_HELP = (
     'Команда /status служит для вывода текущего состояния пользователя. '
@@ -212,6 +215,16 @@ ALTER_LIMIT_LOG = (
     ' пользователем {admin}'
 )
 COMMAND_ERROR = 'Ошибка при выполнении команды'
+WORKERS_STATUS = (
+    '<i>Обработчик</i> - <i>Интервал, с</i> - <i>Ошибок подряд</i> - '
+    '<i>Последний успешный проход</i>\n{workers}'
+)
+QUERIES_STATUS = (
+    '<i>Запрос</i> - <i>Вызовов</i> - <i>Среднее, мс</i> - '
+    '<i>Максимум, мс</i> - <i>Ожидание в очереди, мс</i>\n{queries}\n\n'
+    'Кэш авторизации: {hits} попаданий, {misses} промахов '
+    '({hit_rate:.0%}), {size} записей, {evictions} вытеснено'
+)
 
 
 async def is_authorized(
@@ -220,7 +233,7 @@ async def is_authorized(
 ) -> TelegramUser:
 
     try:
-        return TelegramUser.authenticate(
+        return await async_db.authenticate(
             message.from_user.id, apply_join=apply_join)
 
     except UnauthorizedAccessError:
@@ -236,9 +249,9 @@ async def not_authorized(
     bot: Bot
 ):
 
-    await bot.send_message(
-        chat_id=user.id,
-        text=NOT_ALLOWED_RESPONSE.format(
+    outbox.send(
+        user.id,
+        NOT_ALLOWED_RESPONSE.format(
             admin_name=config.bot.admin_name
         )
     )
@@ -330,7 +343,7 @@ async def parse_file(message: Message):
         return
 
     try:
-        calculation = Calculation.new_calculation(
+        calculation = await async_db.new_calculation(
             name=basename + ext,
             command=runner.create_command(args, filename='{}'),
             user=tg_user.user,
@@ -357,7 +370,17 @@ async def parse_file(message: Message):
 
     calculation_path = create_calculation_path(calculation)
 
-    await message.bot.download_file(file.file_path, calculation_path)
+    if cluster.stream_uploads:
+        await stream_to_cluster(
+            calculation,
+            cluster,
+            partial(message.bot.download_file, file.file_path)
+        )
+    else:
+        await message.bot.download_file(file.file_path, calculation_path)
+    # Instances without workers leave it to the handoff from the database
+    if cluster.label in workers:
+        submit(calculation, cluster.label)
 
     await message.reply(RUN_MESSAGE.format(program=runner.program))
 
@@ -387,7 +410,8 @@ async def update_data(message: Message):
         await message.answer(UPDATE_ALREADY_APPROVED)
         return
 
-    first_name, last_name, organization = person.update_from_raw_data(
+    first_name, last_name, organization = await async_db.update_person(
+        person,
         first_name=get_str_from_re(FIRST_NAME_RE, message.text, 1),
         last_name=get_str_from_re(LAST_NAME_RE, message.text, 1),
         organization=get_str_from_re(ORGANIZATION_RE, message.text, 1),
@@ -427,22 +451,22 @@ async def approve_data(message: Message, command: CommandObject):
         await message.answer(APPROVE_HELP)
         return
 
-    user = UserModel.approve(idx)
-    if user is None:
+    tg_user = await async_db.approve_user(idx)
+    if tg_user is None:
         await message.answer(APPROVE_FAILED)
         return
 
     await message.answer(APPROVE_OK)
-    await message.bot.send_message(
-        user.tg_user[0].tg_id,
+    outbox.send(
+        tg_user.tg_id,
         APPROVE_NOTIFY.format(
-            calc_limit=user.calculation_limit
+            calc_limit=tg_user.user.calculation_limit
         )
     )
     await log_message(message.bot, APPROVE_LOG.format(
-        user=create_user_link(model=user.tg_user[0]),
+        user=create_user_link(model=tg_user),
         admin=create_user_link(message.from_user),
-        calc_limit=user.calculation_limit
+        calc_limit=tg_user.user.calculation_limit
     ))
 
 
@@ -458,15 +482,15 @@ async def block_user(message: Message, command: CommandObject):
         await message.answer(BLOCK_HELP)
         return
 
-    user = UserModel.block(idx)
-    if user is None:
+    tg_user = await async_db.block_user(idx)
+    if tg_user is None:
         await message.answer(BLOCK_FAILED)
         return
 
     await message.answer(BLOCK_OK)
-    await message.bot.send_message(user.tg_user[0].tg_id, BLOCK_NOTIFY)
+    outbox.send(tg_user.tg_id, BLOCK_NOTIFY)
     await log_message(message.bot, BLOCK_LOG.format(
-        user=create_user_link(model=user.tg_user[0]),
+        user=create_user_link(model=tg_user),
         admin=create_user_link(message.from_user),
     ))
 
@@ -483,15 +507,15 @@ async def unblock_user(message: Message, command: CommandObject):
         await message.answer(UNBLOCK_HELP)
         return
 
-    user = UserModel.unblock(idx)
-    if user is None:
+    tg_user = await async_db.unblock_user(idx)
+    if tg_user is None:
         await message.answer(UNBLOCK_FAILED)
         return
 
     await message.answer(UNBLOCK_OK)
-    await message.bot.send_message(user.tg_user[0].tg_id, UNBLOCK_NOTIFY)
+    outbox.send(tg_user.tg_id, UNBLOCK_NOTIFY)
     await log_message(message.bot, UNBLOCK_LOG.format(
-        user=create_user_link(model=user.tg_user[0]),
+        user=create_user_link(model=tg_user),
         admin=create_user_link(message.from_user),
     ))
 
@@ -506,7 +530,7 @@ async def list_users(message: Message, command: CommandObject):
     if command.args is not None and command.args.strip() == 'all':
         remove_blocked = False
 
-    users = get_all_with_calcs(
+    users = await async_db.get_all_with_calcs(
         since=get_month_start(),
         remove_blocked=remove_blocked,
     )
@@ -535,7 +559,7 @@ async def user_status(message: Message, command: CommandObject):
         except (ValueError, TypeError):
             await message.answer(STATUS_HELP)
             return
-        user = get_tg_user_with_calcs(
+        user = await async_db.get_tg_user_with_calcs(
             user_id=idx,
             since=month_ago
         )
@@ -543,7 +567,8 @@ async def user_status(message: Message, command: CommandObject):
             await message.answer(STATUS_NOT_FOUND)
             return
     else:
-        user = get_tg_user_with_calcs(message.from_user.id, since=month_ago)
+        user = await async_db.get_tg_user_with_calcs(
+            tg_id=message.from_user.id, since=month_ago)
 
         if user is None:
             await not_authorized(message.from_user, message.bot)
@@ -559,7 +584,8 @@ async def user_status(message: Message, command: CommandObject):
         USER_STATUS.format(user=create_user_link(model=user),
                            organization=org_name,
                            limit=user.user.calculation_limit,
-                           used=user.num_calc))
+                           used=user.num_calc,
+                           core_hours=user.cpu_time / 3600))
 
 
 @message_router.message(Command(commands=['search']))
@@ -572,7 +598,7 @@ async def search_user(message: Message, command: CommandObject):
         return
 
     args = [a.strip() for a in command.args.split(',')]
-    users = search_users(
+    users = await async_db.search_users(
         last_name=args[0] if args[0] != '' else None,
         first_name=args[1] if len(args) > 1 and args[1] != '' else None,
         organization=args[2] if len(args) > 2 and args[2] != '' else None,
@@ -616,7 +642,7 @@ async def alter_limit(message: Message, command: CommandObject):
         await message.answer(ALTER_LIMIT_USAGE)
         return
 
-    user = get_tg_user(user_id=idx)
+    user = await async_db.get_tg_user(user_id=idx)
     if user is None:
         await message.answer(STATUS_NOT_FOUND)
         return
@@ -628,8 +654,8 @@ async def alter_limit(message: Message, command: CommandObject):
         org_name = org.name
 
     try:
-        user.user.calculation_limit = limit
-        user.user.save()
+        await async_db.set_calculation_limit(user.user, limit)
+        config.bot.auth_cache.invalidate(user_id=user.user.id)
     except Exception:
         await message.answer(COMMAND_ERROR)
         return
@@ -647,6 +673,49 @@ async def alter_limit(message: Message, command: CommandObject):
     )
 
 
+@message_router.message(Command(commands=['workers']))
+async def workers_status(message: Message):
+    if message.from_user.username != config.bot.admin_name[1:]:
+        await message.answer(NOT_ALLOWED_COMMAND)
+        return
+
+    lines = []
+    for name, worker in workers.items():
+        interval = '-' if worker.interval is None else f'{worker.interval:.0f}'
+        last_sweep = '-' if worker.last_sweep is None else \
+            worker.last_sweep.strftime('%Y-%m-%d %H:%M:%S UTC')
+        lines.append(
+            f'{name} - {interval} - {worker.failures} - {last_sweep}')
+
+    await message.answer(WORKERS_STATUS.format(workers='\n'.join(lines)))
+
+
+@message_router.message(Command(commands=['queries']))
+async def queries_status(message: Message):
+    if message.from_user.username != config.bot.admin_name[1:]:
+        await message.answer(NOT_ALLOWED_COMMAND)
+        return
+
+    lines = []
+    for name, stats in sorted(config.executor.get_db_stats().items()):
+        lines.append(
+            f'{name} - {stats.count} - '
+            f'{stats.total / stats.count * 1000:.1f} - '
+            f'{stats.max * 1000:.1f} - '
+            f'{stats.wait / stats.count * 1000:.1f}'
+        )
+
+    cache = config.bot.auth_cache.get_stats()
+    await message.answer(QUERIES_STATUS.format(
+        queries='\n'.join(lines),
+        hits=cache.hits,
+        misses=cache.misses,
+        hit_rate=cache.get_hit_rate(),
+        size=cache.size,
+        evictions=cache.evictions
+    ))
+
+
 @message_router.message()
 async def default_message(message: Message):
     await message.answer(UNRECOGNIZED_COMMAND)
@@ -2,8 +2,8 @@ from typing import Optional, Pattern
 from aiogram import Bot
 from aiogram.types import User
 
+from .outbox import outbox
 from ..models import TelegramUser as TgUserModel
-from ..utils import config
 
 
 USER_LINK = (
@@ -13,17 +13,8 @@ USER_LINK = (
 
 
 async def log_message(bot: Bot, text: str, file: str = None):
-    if config.bot.log_chat_id is None:
-        return
-
-    if file is not None:
-        await bot.send_document(
-            config.bot.log_chat_id,
-            document=file,
-            caption=text
-        )
-    else:
-        await bot.send_message(config.bot.log_chat_id, text)
+    # Sent later by the outbox, text entries are joined into digests
+    outbox.log(text, file)
 
 
 def create_user_link(user: User = None, model: TgUserModel = None) -> str:
@@ -0,0 +1,27 @@
+from typing import Optional
+from pydantic import BaseModel, Field, SecretStr
+
+
+class Webhook(BaseModel):
+    url: Optional[str] = None
+    path: str = '/webhook'
+    host: str = '0.0.0.0'
+    port: int = Field(8080, ge=1)
+    secret_token: Optional[SecretStr] = None
+    max_concurrency: int = Field(16, ge=1)
+    run_workers: bool = True
+    # Several instances serve the bot and share one database
+    shared: bool = False
+    handoff_time: int = Field(10, ge=1)
+    shared_cache_ttl: int = Field(10, ge=0)
+
+    def is_shared(self) -> bool:
+        return self.shared or not self.run_workers
+
+    def get_url(self) -> str:
+        return self.url.rstrip('/') + self.path
+
+    def get_secret(self) -> Optional[str]:
+        if self.secret_token is None:
+            return None
+        return self.secret_token.get_secret_value()
@@ -1,2 +1,2 @@
 from .config import config
-from .utils import get_month_start
+from .utils import get_month_start, get_fetch_time
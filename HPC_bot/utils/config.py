@@ -2,9 +2,9 @@ import json
 import logging
 from typing import List, Tuple, Union
 
-from pydantic import BaseModel, model_validator
+from pydantic import BaseModel, Field, model_validator
 
-from ..hpc import Cluster, Database, RemoteStorage
+from ..hpc import Cluster, Database, Executor, Placement, RemoteStorage
 from ..telegram import Bot
 
 
@@ -19,14 +19,20 @@ class Config(BaseModel):
     download_path: str = 'downloads/'
     storage: RemoteStorage = None
     fetch_time: Union[int, Tuple[int, int]] = (120, 240)
+    idle_fetch_time: int = 900
+    fast_fetch_time: int = 30
+    backoff_time: Tuple[int, int] = (30, 1800)
+    reconcile_time: int = 1800
     max_file_size: int = 1024 * 1024
     extensions_whitelist: List[str] = ['.out', '.log', '.err']
 
     log_level: Union[int, str] = 'DEBUG'
     log_file: str = None
 
-    db: Database = Database()
-    bot: Bot = Bot()
+    db: Database = Field(default_factory=Database)
+    executor: Executor = Field(default_factory=Executor)
+    placement: Placement = Field(default_factory=Placement)
+    bot: Bot = Field(default_factory=Bot)
 
     clusters: List[Cluster] = []
 
@@ -1,4 +1,6 @@
 from datetime import datetime, timedelta
+from random import randint
+from typing import Tuple, Union
 
 
 def get_month_start() -> datetime:
@@ -8,3 +10,10 @@ def get_month_start() -> datetime:
         second=0,
         microsecond=0
     )
+
+
+def get_fetch_time(fetch_time: Union[int, Tuple[int, int]]) -> int:
+    if isinstance(fetch_time, int):
+        return fetch_time
+
+    return randint(fetch_time[0], fetch_time[1])
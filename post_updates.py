@@ -0,0 +1,58 @@
+import argparse
+import asyncio
+import time
+
+from aiohttp import ClientSession
+
+from HPC_bot.telegram.server import SECRET_HEADER, make_message_update
+
+
+# Posts fake Telegram updates to a locally running bot in webhook mode and
+# measures response time of the webhook. Replies of the bot are still sent
+# to Telegram, so use ids of real test accounts to see them
+async def post(
+    session: ClientSession,
+    url: str,
+    headers: dict,
+    update: dict
+) -> float:
+    start = time.perf_counter()
+    async with session.post(url, json=update, headers=headers) as response:
+        response.raise_for_status()
+    return time.perf_counter() - start
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default='http://localhost:8080/webhook')
+    parser.add_argument('--secret', default=None,
+                        help='secret_token of the webhook config')
+    parser.add_argument('--user-id', type=int, default=1)
+    parser.add_argument('--text', default='/help')
+    parser.add_argument('--count', type=int, default=1)
+    args = parser.parse_args()
+
+    headers = {}
+    if args.secret is not None:
+        headers[SECRET_HEADER] = args.secret
+
+    first_id = int(time.time())
+    async with ClientSession() as session:
+        latencies = await asyncio.gather(*[
+            post(
+                session,
+                args.url,
+                headers,
+                make_message_update(first_id + i, args.user_id, args.text)
+            )
+            for i in range(args.count)
+        ])
+
+    latencies = sorted(latencies)
+    print(f'Posted {args.count} updates')
+    print(f'median {latencies[len(latencies) // 2] * 1000:.1f} ms, '
+          f'max {latencies[-1] * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
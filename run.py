@@ -1,51 +1,90 @@
 import asyncio
 import logging
 import os
-from random import randint
+import signal
 
 from aiogram import Bot, Dispatcher
 from aiogram.enums import ParseMode
 from aiogram.exceptions import TelegramMigrateToChat
 from aiogram.filters import ExceptionTypeFilter
+from aiohttp import web
 
 from HPC_bot.utils import config
-from HPC_bot.hpc.manager import update_db, check_updates, upload_to_clusters, start_calculations
-from HPC_bot.hpc.manager import load_finished, send_to_cloud
+from HPC_bot.hpc.manager import update_db
+from HPC_bot.hpc.worker import ClusterWorker, StorageWorker, supervise
+from HPC_bot.hpc.worker import HandoffWorker, PlacementWorker
 from HPC_bot.telegram.text_router import message_router
 from HPC_bot.telegram.chat_router import chat_router
 from HPC_bot.telegram.errors_handling import handle_chat_migration
-from HPC_bot.telegram.manager import notify_on_finished
+from HPC_bot.telegram.middlewares import DatabaseMiddleware
+from HPC_bot.telegram.outbox import outbox
+from HPC_bot.telegram.server import create_app
+from HPC_bot.telegram.manager import NotificationWorker
+
+
+ALLOWED_UPDATES = [
+    'message',
+    'chat_member',
+    'my_chat_member',
+]
 
 
 async def cluster_updates(bot: Bot):
-    while True:
+    workers = [ClusterWorker(cluster) for cluster in config.clusters]
+    workers.append(StorageWorker())
+    workers.append(NotificationWorker(bot))
+    if len(config.clusters) > 1:
+        workers.append(PlacementWorker(config.clusters))
+
+    webhook = config.bot.webhook
+    if webhook is not None and webhook.is_shared():
+        workers.append(HandoffWorker(config.clusters, webhook.handoff_time))
+
+    try:
+        await supervise(workers)
+    except asyncio.CancelledError:
+        pass
+
+
+async def run_polling(dp: Dispatcher, bot: Bot):
+    await bot.delete_webhook()
+    await dp.start_polling(bot, allowed_updates=ALLOWED_UPDATES)
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot):
+    webhook = config.bot.webhook
+    runner = web.AppRunner(create_app(dp, bot, webhook))
+    await runner.setup()
+    await web.TCPSite(runner, webhook.host, webhook.port).start()
+    logging.info(f'Listening for updates on {webhook.host}:{webhook.port}')
+
+    # Several instances behind a load balancer share one url, it may be
+    # registered by any of them
+    if webhook.url is not None:
+        await bot.set_webhook(
+            webhook.get_url(),
+            secret_token=webhook.get_secret(),
+            allowed_updates=ALLOWED_UPDATES,
+            max_connections=webhook.max_concurrency
+        )
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
         try:
-            await upload_to_clusters()
-            await start_calculations()
-            await check_updates()
-            await load_finished()
-            await send_to_cloud()
-            await notify_on_finished(bot)
-        except asyncio.CancelledError:
-            break
-
-        except Exception as e:
-            logging.exception(
-                'Error while handling updates',
-                exc_info=e,
-                stack_info=True
-            )
-        if isinstance(config.fetch_time, int):
-            await asyncio.sleep(config.fetch_time)
-            continue
-        await asyncio.sleep(randint(
-            config.fetch_time[0],
-            config.fetch_time[1]
-        ))
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass
+
+    try:
+        await stop.wait()
+    finally:
+        await runner.cleanup()
 
 
 async def main() -> None:
     dp = Dispatcher()
+    dp.update.outer_middleware(DatabaseMiddleware())
     dp.include_router(message_router)
     dp.include_router(chat_router)
 
@@ -59,15 +98,25 @@ async def main() -> None:
     me = await bot.get_me()
     config.bot.bot_name = me.full_name
 
-    updates = asyncio.create_task(cluster_updates(bot))
+    webhook = config.bot.webhook
+    outbox.start(bot)
+    updates = None
+    if webhook is None or webhook.run_workers:
+        updates = asyncio.create_task(cluster_updates(bot))
+
+    try:
+        if webhook is None:
+            await run_polling(dp, bot)
+        else:
+            await run_webhook(dp, bot)
+    finally:
+        if updates is not None:
+            updates.cancel()
+            await updates
+        await outbox.stop()
+        await bot.session.close()
 
-    await dp.start_polling(bot, allowed_updates=[
-        'message',
-        'chat_member',
-        'my_chat_member',
-    ])
-    updates.cancel()
-    await updates
+        config.executor.shutdown()
 
 
 if __name__ == "__main__":
@@ -2,18 +2,35 @@ from distutils import dir_util
 import os
 import pathlib
 import shutil
+import subprocess
 import sys
+from collections import Counter
+from datetime import datetime
 
+import asyncio
 import paramiko
 import pytest
 
-from HPC_bot.hpc import Connection
+from HPC_bot.hpc import Cluster, Connection, Compressions, TransferModes
+from HPC_bot.hpc import Runner
+from HPC_bot.hpc import manager
+from HPC_bot.hpc.connection import split_ranges
+from HPC_bot.hpc.manifest import FileState, TransferManifest
+from HPC_bot.models import Calculation, CalculationStatus
+from HPC_bot.utils import config
 
 
 class MockTransport:
 
+    def __init__(self):
+        self.alive = True
+        self.keepalive = None
+
     def is_alive(self, *args, **kwargs):
-        return True
+        return self.alive
+
+    def set_keepalive(self, interval):
+        self.keepalive = interval
 
 
 class FileData:
@@ -29,37 +46,153 @@ class MockSFTP:
 
     def __init__(self, datadir):
         self.datadir = datadir
+        self.calls = Counter()
 
     def get(self, remotepath, localpath, *args, **kwargs):
+        self.calls['get'] += 1
         shutil.copyfile(self._build_remote_path(remotepath), localpath)
 
     def listdir(self, remotepath, *args, **kwargs):
+        self.calls['listdir'] += 1
         return os.listdir(self._build_remote_path(remotepath))
 
+    def listdir_attr(self, remotepath, *args, **kwargs):
+        self.calls['listdir_attr'] += 1
+        path = self._build_remote_path(remotepath)
+        return [
+            paramiko.SFTPAttributes.from_stat(os.lstat(path / f), f)
+            for f in os.listdir(path)
+        ]
+
     def mkdir(self, remotepath, *args, **kwargs):
+        self.calls['mkdir'] += 1
         os.mkdir(self._build_remote_path(remotepath))
 
     def lstat(self, remotepath, *args, **kwargs):
+        self.calls['lstat'] += 1
         return os.lstat(self._build_remote_path(remotepath))
 
+    def stat(self, remotepath, *args, **kwargs):
+        self.calls['stat'] += 1
+        return paramiko.SFTPAttributes.from_stat(
+            os.stat(self._build_remote_path(remotepath)))
+
     def put(self, localpath, remotepath, *args, **kwargs):
+        self.calls['put'] += 1
         shutil.copyfile(localpath, self._build_remote_path(remotepath))
 
+    def open(self, remotepath, mode='r', *args, **kwargs):
+        self.calls['open'] += 1
+        return MockRemoteFile(self._build_remote_path(remotepath), mode)
+
+    def remove(self, remotepath):
+        self.calls['remove'] += 1
+        os.remove(self._build_remote_path(remotepath))
+
+    def rmdir(self, remotepath):
+        self.calls['rmdir'] += 1
+        os.rmdir(self._build_remote_path(remotepath))
+
+    def close(self):
+        pass
+
+
+class MockRemoteFile:
+
+    def __init__(self, path, mode):
+        self.file = open(path, mode)
+        self.requests = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.file.close()
+
+    def seek(self, offset):
+        self.file.seek(offset)
+
+    def set_pipelined(self, pipelined=True):
+        pass
+
+    def write(self, data):
+        self.file.write(data)
+
+    def prefetch(self, *args, **kwargs):
+        pass
+
+    def read(self, size=-1):
+        return self.file.read(size)
+
+    def readv(self, chunks):
+        for offset, length in chunks:
+            self.requests.append((offset, length))
+            self.file.seek(offset)
+            yield self.file.read(length)
+
+
+class MockChannel:
+
+    def __init__(self, process: subprocess.Popen):
+        self.process = process
+
+    def recv_exit_status(self):
+        return self.process.wait()
+
+    def shutdown_write(self):
+        self.process.stdin.close()
+
+
+class MockChannelFile:
+
+    def __init__(self, file, process: subprocess.Popen):
+        self.file = file
+        self.channel = MockChannel(process)
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+    def readlines(self):
+        return [line.decode() for line in self.file.readlines()]
+
 
 class MockSSH:
 
     def __init__(self, datadir):
         self.datadir = datadir
+        self.transport = MockTransport()
+        self.sftp_opened = 0
+        self.commands = []
 
     def connect(self, *args, **kwargs):
         pass
 
+    def close(self):
+        self.transport.alive = False
+
     def get_transport(self, *args, **kwargs):
-        return MockTransport()
+        return self.transport
 
     def open_sftp(self, *args, **kwargs):
+        self.sftp_opened += 1
         return MockSFTP(self.datadir)
 
+    def exec_command(self, command, *args, **kwargs):
+        self.commands.append(command)
+        process = subprocess.Popen(
+            command,
+            shell=True,
+            cwd=self.datadir / 'remote',
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        return (
+            MockChannelFile(process.stdin, process),
+            MockChannelFile(process.stdout, process),
+            MockChannelFile(process.stderr, process),
+        )
+
 
 class MockHTTP:
     pass
@@ -134,3 +267,587 @@ def test_put_folder_by_sftp(connection: Connection, datadir: pathlib.Path):
     remote_folder = os.listdir(datadir / 'remote' / folder_name)
     assert os.path.exists(datadir / 'remote' / folder_name)
     assert local_folder == remote_folder
+
+
+def test_sftp_sessions_are_reused(connection: Connection):
+    with connection.sftp_session() as first:
+        pass
+    with connection.sftp_session() as second:
+        pass
+
+    assert first is second
+    assert connection.ssh_client.sftp_opened == 1
+
+
+def test_concurrent_sftp_sessions(connection: Connection):
+    with connection.sftp_session() as first:
+        with connection.sftp_session() as second:
+            assert first is not second
+
+    assert connection.ssh_client.sftp_opened == 2
+
+
+def test_reconnect_after_transport_died(
+    connection: Connection,
+    datadir: pathlib.Path,
+    monkeypatch
+):
+    connection.ssh_client.close()
+    monkeypatch.setattr(
+        Connection, 'connect_ssh', lambda self: MockSSH(datadir))
+
+    ssh = connection.get_ssh_client()
+
+    assert ssh.get_transport().is_alive()
+    assert connection.ssh_client is ssh
+
+
+def test_reconnect_retries_with_backoff(
+    connection: Connection,
+    datadir: pathlib.Path,
+    monkeypatch
+):
+    attempts = []
+    delays = []
+
+    def connect_ssh(self):
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise paramiko.SSHException('Connection reset')
+        return MockSSH(datadir)
+
+    monkeypatch.setattr(Connection, 'connect_ssh', connect_ssh)
+    monkeypatch.setattr('time.sleep', delays.append)
+
+    connection.open_ssh()
+
+    assert len(attempts) == 3
+    assert len(delays) == 2
+    assert all(0 <= d <= 30 for d in delays)
+
+
+def test_channel_error_keeps_transport(
+    connection: Connection,
+    monkeypatch
+):
+    ssh = connection.ssh_client
+    exec_command = ssh.exec_command
+    refused = []
+
+    def refuse_once(command, *args, **kwargs):
+        if not refused:
+            refused.append(command)
+            raise paramiko.ChannelException(1, 'Administratively prohibited')
+        return exec_command(command, *args, **kwargs)
+
+    with connection.sftp_session():
+        pass
+    monkeypatch.setattr(ssh, 'exec_command', refuse_once)
+    monkeypatch.setattr('time.sleep', lambda x: None)
+    monkeypatch.setattr(Connection, 'open_ssh', lambda self: pytest.fail(
+        'Live transport must not be reopened'))
+
+    assert connection.execute_by_ssh('echo test')[0] == 'test\n'
+    assert refused == ['echo test']
+    assert connection.ssh_client is ssh
+    assert ssh.sftp_opened == 1
+
+
+def test_channel_error_is_raised_on_retry(
+    connection: Connection,
+    monkeypatch
+):
+    def refuse(command, *args, **kwargs):
+        raise paramiko.ChannelException(1, 'Administratively prohibited')
+
+    monkeypatch.setattr(connection.ssh_client, 'exec_command', refuse)
+    monkeypatch.setattr('time.sleep', lambda x: None)
+
+    with pytest.raises(paramiko.ChannelException):
+        connection.execute_by_ssh('echo test')
+    assert connection.ssh_client.get_transport().is_alive()
+
+
+def test_reconnect_gives_up(connection: Connection, monkeypatch):
+    def connect_ssh(self):
+        raise TimeoutError()
+
+    monkeypatch.setattr(Connection, 'connect_ssh', connect_ssh)
+    monkeypatch.setattr('time.sleep', lambda x: None)
+
+    with pytest.raises(ConnectionError):
+        connection.open_ssh()
+
+
+@pytest.mark.parametrize('compression', [
+    Compressions.NONE,
+    Compressions.GZIP,
+])
+def test_get_folder_by_tar(
+    connection: Connection,
+    datadir: pathlib.Path,
+    compression: Compressions
+):
+    remote = datadir / 'remote' / 'folder'
+    (remote / 'input_1.tmp').write_text('scratch')
+    os.makedirs(remote / 'nested')
+    (remote / 'nested' / 'hessian').write_text('hessian')
+
+    connection.get_by_tar('folder', str(datadir), compression)
+
+    local = datadir / 'folder'
+    assert sorted(os.listdir(local)) == ['input_1.inp', 'input_2.inp', 'nested']
+    assert os.listdir(local / 'nested') == ['hessian']
+    assert (local / 'input_1.inp').read_bytes() == \
+        (remote / 'input_1.inp').read_bytes()
+
+
+def test_get_missing_folder_by_tar(
+    connection: Connection,
+    datadir: pathlib.Path
+):
+    with pytest.raises(IOError):
+        connection.get_by_tar('missing', str(datadir))
+
+
+@pytest.mark.parametrize('compression', [
+    Compressions.NONE,
+    Compressions.GZIP,
+])
+def test_put_folder_by_tar(
+    connection: Connection,
+    datadir: pathlib.Path,
+    compression: Compressions
+):
+    connection.put_by_tar(
+        str(datadir / 'new_folder'),
+        'uploads/new_folder',
+        compression
+    )
+
+    remote = datadir / 'remote' / 'uploads' / 'new_folder'
+    assert sorted(os.listdir(remote)) == \
+        sorted(os.listdir(datadir / 'new_folder'))
+
+
+def test_cluster_uses_tar_mode(connection: Connection, datadir: pathlib.Path):
+    cluster = Cluster(
+        label='test',
+        connection=connection,
+        upload_path='.',
+        transfer_mode='tar',
+        compression='gzip'
+    )
+    assert cluster.transfer_mode == TransferModes.TAR
+
+    success = cluster.download_dirs(['folder'], [str(datadir)])
+
+    assert success == [True]
+    assert sorted(os.listdir(datadir / 'folder')) == \
+        ['input_1.inp', 'input_2.inp']
+
+
+METADATA_CALLS = ('lstat', 'listdir', 'listdir_attr', 'mkdir')
+
+
+def count_metadata_calls(sftp: MockSFTP) -> int:
+    return sum(sftp.calls[name] for name in METADATA_CALLS)
+
+
+@pytest.mark.parametrize('files', [1, 10, 100])
+def test_get_folder_metadata_calls(
+    connection: Connection,
+    datadir: pathlib.Path,
+    files: int
+):
+    remote = datadir / 'remote' / 'many'
+    os.makedirs(remote)
+    for i in range(files):
+        (remote / f'input_{i}.out').write_text(str(i))
+
+    with connection.sftp_session() as sftp:
+        pass
+    connection.get_by_sftp('many', str(datadir))
+
+    assert len(os.listdir(datadir / 'many')) == files
+    assert sftp.calls['get'] == files
+    assert count_metadata_calls(sftp) == 2
+
+
+@pytest.mark.parametrize('files', [1, 10, 100])
+def test_put_folder_metadata_calls(
+    connection: Connection,
+    datadir: pathlib.Path,
+    files: int
+):
+    local = datadir / 'many'
+    os.makedirs(local)
+    for i in range(files):
+        (local / f'input_{i}.inp').write_text(str(i))
+
+    os.makedirs(datadir / 'remote' / 'uploads')
+
+    with connection.sftp_session() as sftp:
+        pass
+    connection.put_by_sftp(str(local), 'uploads')
+    uploaded = count_metadata_calls(sftp)
+    connection.put_by_sftp(str(local), 'uploads')
+
+    assert len(os.listdir(datadir / 'remote' / 'uploads' / 'many')) == files
+    assert sftp.calls['put'] == 2 * files
+    assert uploaded <= 5
+    assert count_metadata_calls(sftp) == uploaded
+
+
+def test_split_ranges():
+    assert split_ranges(10, 3, 2) == [(0, 4), (4, 4), (8, 2)]
+    assert split_ranges(10, 4, 100) == [(0, 10)]
+    assert sum(length for _, length in split_ranges(1001, 4, 10)) == 1001
+
+
+def test_get_large_file_in_parallel(datadir: pathlib.Path):
+    remote = datadir / 'remote' / 'large'
+    os.makedirs(remote)
+    content = os.urandom(100_000)
+    (remote / 'result.gbw').write_bytes(content)
+    (remote / 'result.out').write_text('small')
+
+    connection = Connection(
+        host='localhost',
+        port=22,
+        user='test',
+        password='test',
+        max_sftp=3,
+        large_file_size=1000,
+        chunk_size=4096
+    )
+    connection.ssh_client = MockSSH(datadir)
+
+    connection.get_by_sftp('large', str(datadir))
+
+    assert (datadir / 'large' / 'result.gbw').read_bytes() == content
+    assert (datadir / 'large' / 'result.out').read_text() == 'small'
+
+
+def make_resumable_cluster(connection: Connection, **kwargs) -> Cluster:
+    return Cluster(
+        label='test',
+        connection=connection,
+        upload_path='.',
+        **kwargs
+    )
+
+
+def test_download_skips_transferred_files(
+    connection: Connection,
+    datadir: pathlib.Path
+):
+    cluster = make_resumable_cluster(connection)
+    local = datadir / 'downloads'
+    os.makedirs(local)
+
+    assert cluster.download_dirs(['folder'], [str(local)]) == [True]
+    with connection.sftp_session() as sftp:
+        pass
+    opened = sftp.calls['open']
+
+    (datadir / 'remote' / 'folder' / 'input_3.inp').write_text('new')
+    assert cluster.download_dirs(['folder'], [str(local)]) == [True]
+
+    assert sorted(os.listdir(local / 'folder')) == \
+        ['input_1.inp', 'input_2.inp', 'input_3.inp']
+    assert sftp.calls['open'] == opened + 1
+
+    manifest = TransferManifest.load(
+        TransferManifest.get_path(str(local), 'folder'))
+    assert sorted(manifest.files) == \
+        ['input_1.inp', 'input_2.inp', 'input_3.inp']
+    assert all(state.complete for state in manifest.files.values())
+
+
+def test_download_resumes_partial_file(
+    connection: Connection,
+    datadir: pathlib.Path
+):
+    remote = datadir / 'remote' / 'partial'
+    os.makedirs(remote)
+    content = os.urandom(10_000)
+    (remote / 'result.out').write_bytes(content)
+
+    local = datadir / 'downloads'
+    os.makedirs(local / 'partial')
+    (local / 'partial' / 'result.out.part').write_bytes(content[:4000])
+
+    stat = os.stat(remote / 'result.out')
+    manifest_path = TransferManifest.get_path(str(local), 'partial')
+    TransferManifest(files={'result.out': FileState(
+        size=stat.st_size, mtime=int(stat.st_mtime))}).save(manifest_path)
+
+    reads = []
+    read = MockRemoteFile.read
+
+    def tracked_read(self, size=-1):
+        data = read(self, size)
+        reads.append(len(data))
+        return data
+
+    MockRemoteFile.read = tracked_read
+    try:
+        cluster = make_resumable_cluster(connection)
+        assert cluster.download_dirs(['partial'], [str(local)]) == [True]
+    finally:
+        MockRemoteFile.read = read
+
+    assert (local / 'partial' / 'result.out').read_bytes() == content
+    assert not (local / 'partial' / 'result.out.part').exists()
+    assert sum(reads) == 6000
+
+
+def test_download_verifies_checksums(
+    connection: Connection,
+    datadir: pathlib.Path
+):
+    cluster = make_resumable_cluster(connection, verify_checksums=True)
+    local = datadir / 'downloads'
+    os.makedirs(local)
+
+    assert cluster.download_dirs(['folder'], [str(local)]) == [True]
+
+    manifest = TransferManifest.load(
+        TransferManifest.get_path(str(local), 'folder'))
+    assert all(state.sha256 for state in manifest.files.values())
+
+
+def test_download_drops_corrupted_files(
+    connection: Connection,
+    datadir: pathlib.Path,
+    monkeypatch
+):
+    cluster = make_resumable_cluster(connection, verify_checksums=True)
+    local = datadir / 'downloads'
+    os.makedirs(local)
+
+    monkeypatch.setattr(
+        'HPC_bot.hpc.connection.get_sha256', lambda path: 'corrupted')
+    assert cluster.download_dirs(['folder'], [str(local)]) == [False]
+    assert os.listdir(local / 'folder') == []
+
+    monkeypatch.undo()
+    assert cluster.download_dirs(['folder'], [str(local)]) == [True]
+    assert sorted(os.listdir(local / 'folder')) == \
+        ['input_1.inp', 'input_2.inp']
+
+
+def test_perform_commands_in_one_round_trip(
+    connection: Connection,
+    datadir: pathlib.Path
+):
+    cluster = Cluster(
+        label='test',
+        connection=connection,
+        upload_path='.',
+        runners=[Runner(
+            program='echo',
+            allowed_args=['Submitted', 'batch', 'job', r'\d+']
+        )]
+    )
+    for folder in ['a', 'b']:
+        os.makedirs(datadir / 'remote' / folder)
+
+    outputs = cluster.perform_commands([
+        ('echo Submitted batch job 11', None, 'a'),
+        ('rm -rf /', None, 'a'),
+        ('echo Submitted batch job 13', 'input.inp', 'b'),
+        ('echo Submitted batch job 12', None, 'b'),
+    ])
+
+    assert outputs == [
+        'Submitted batch job 11\n',
+        None,
+        'Submitted batch job 13\n',
+        'Submitted batch job 12\n',
+    ]
+    assert len(connection.ssh_client.commands) == 1
+
+
+def test_start_array(
+    connection: Connection,
+    datadir: pathlib.Path,
+    monkeypatch
+):
+    remote = datadir / 'remote'
+    bin_dir = datadir / 'bin'
+    os.makedirs(bin_dir)
+    (bin_dir / 'sbatch').write_text(
+        '#!/bin/sh\n'
+        'echo "$@" > sbatch_args\n'
+        'echo "Submitted batch job 77"\n'
+    )
+    os.chmod(bin_dir / 'sbatch', 0o755)
+    monkeypatch.setenv('PATH', f'{bin_dir}{os.pathsep}{os.environ["PATH"]}')
+
+    script = remote / 'run.sh'
+    script.write_text(
+        '#!/bin/bash\n'
+        '#SBATCH --ntasks=4\n'
+        'echo "$1 $SLURM_SUBMIT_DIR" > result.out\n'
+    )
+
+    cluster = Cluster(
+        label='test',
+        connection=connection,
+        upload_path='.',
+        array_packing=True,
+        runners=[Runner(
+            program='sbatch',
+            allowed_args=[r'--partition=\w+', r'\S+\.sh', '{}']
+        )]
+    )
+    calculations = [
+        Calculation(
+            id=i,
+            name=f'conformer_{i}.gjf',
+            command=f"sbatch --partition=short {script} '{{}}'",
+            start_datetime=datetime(2023, 1, 1),
+            user=1
+        )
+        for i in range(3)
+    ]
+    for calculation in calculations:
+        os.makedirs(remote / calculation.get_folder_name())
+
+    arrays, singles = manager.split_arrays(cluster, calculations)
+    assert arrays == [calculations] and singles == []
+
+    assert manager.start_array(calculations, cluster) == 77
+
+    array_dir = remote / 'arrays' / calculations[0].get_folder_name()
+    assert (array_dir / 'sbatch_args').read_text().split() == \
+        ['--array=0-2', '--partition=short', 'job.sh']
+    job = (array_dir / 'job.sh').read_text()
+    assert '#SBATCH --ntasks=4' in job
+
+    for task_id, calculation in enumerate(calculations):
+        subprocess.run(
+            ['bash', 'job.sh'],
+            cwd=array_dir,
+            check=True,
+            env={
+                **os.environ,
+                'SLURM_ARRAY_JOB_ID': '77',
+                'SLURM_ARRAY_TASK_ID': str(task_id),
+                'SLURM_SUBMIT_DIR': str(array_dir),
+            }
+        )
+        folder = remote / calculation.get_folder_name()
+        assert (folder / 'result.out').read_text().split() == \
+            [calculation.name, str(folder.resolve())]
+
+
+def make_stream_calculation() -> Calculation:
+    return Calculation(
+        id=1,
+        name='input.inp',
+        command='sbatch run.sh input.inp',
+        start_datetime=datetime(2023, 1, 1),
+        user=1
+    )
+
+
+async def download_chunks(destination):
+    for i in range(3):
+        destination.write(f'line {i}\n'.encode())
+        await asyncio.sleep(0)
+
+
+def test_stream_to_cluster(
+    connection: Connection,
+    datadir: pathlib.Path,
+    monkeypatch
+):
+    saved = []
+
+    async def run(name, func, *args, **kwargs):
+        saved.append(name)
+
+    monkeypatch.setattr(manager.async_db, 'run', run)
+    monkeypatch.setattr(config, 'download_path', str(datadir / 'local'))
+    cluster = Cluster(label='test', connection=connection, upload_path='.')
+    calculation = make_stream_calculation()
+
+    assert asyncio.run(manager.stream_to_cluster(
+        calculation, cluster, download_chunks))
+
+    remote = datadir / 'remote' / calculation.get_folder_name()
+    assert (remote / 'input.inp').read_text() == 'line 0\nline 1\nline 2\n'
+    assert calculation.get_status() == CalculationStatus.UPLOADED
+    assert saved == ['set_uploaded']
+    assert not os.path.exists(datadir / 'local')
+
+
+def test_stream_to_cluster_keeps_local_copy(
+    connection: Connection,
+    datadir: pathlib.Path,
+    monkeypatch
+):
+    def put_stream_by_sftp(self, chunks, remote_path):
+        raise IOError('Connection lost')
+
+    monkeypatch.setattr(
+        Connection, 'put_stream_by_sftp', put_stream_by_sftp)
+    monkeypatch.setattr(config, 'download_path', str(datadir / 'local'))
+    cluster = Cluster(label='test', connection=connection, upload_path='.')
+    calculation = make_stream_calculation()
+    calculation.status = CalculationStatus.NOT_STARTED.value
+
+    assert not asyncio.run(manager.stream_to_cluster(
+        calculation, cluster, download_chunks))
+
+    local = datadir / 'local' / calculation.get_folder_name() / 'input.inp'
+    assert local.read_text() == 'line 0\nline 1\nline 2\n'
+    assert calculation.get_status() == CalculationStatus.NOT_STARTED
+
+
+def test_failed_stream_is_uploaded_from_local_copy(
+    connection: Connection,
+    datadir: pathlib.Path,
+    monkeypatch
+):
+    def write(self, data):
+        raise IOError('Connection lost')
+
+    monkeypatch.setattr(MockRemoteFile, 'write', write)
+    monkeypatch.setattr(config, 'download_path', str(datadir / 'local'))
+    cluster = Cluster(label='test', connection=connection, upload_path='.')
+    calculation = make_stream_calculation()
+
+    assert not asyncio.run(manager.stream_to_cluster(
+        calculation, cluster, download_chunks))
+    monkeypatch.undo()
+    monkeypatch.setattr(config, 'download_path', str(datadir / 'local'))
+
+    assert asyncio.run(manager.upload_to_cluster(calculation, cluster))
+
+    folder = datadir / 'remote' / calculation.get_folder_name()
+    assert os.listdir(folder) == ['input.inp']
+    assert (folder / 'input.inp').read_text() == 'line 0\nline 1\nline 2\n'
+
+
+def test_interrupted_stream_is_removed(
+    connection: Connection,
+    datadir: pathlib.Path,
+    monkeypatch
+):
+    async def download(destination):
+        destination.write(b'partial')
+        raise ConnectionError('Telegram is unavailable')
+
+    monkeypatch.setattr(config, 'download_path', str(datadir / 'local'))
+    cluster = Cluster(label='test', connection=connection, upload_path='.')
+    calculation = make_stream_calculation()
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(manager.stream_to_cluster(calculation, cluster, download))
+
+    remote = datadir / 'remote' / calculation.get_folder_name()
+    assert not remote.exists()
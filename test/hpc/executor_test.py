@@ -0,0 +1,121 @@
+import asyncio
+import threading
+
+import pytest
+
+from HPC_bot.hpc import Cluster, Connection, Executor
+
+
+def make_cluster(label: str) -> Cluster:
+    return Cluster(
+        label=label,
+        connection=Connection(host='localhost', port=22, user='test'),
+        upload_path='.'
+    )
+
+
+@pytest.fixture
+def executor():
+    executor = Executor(max_workers=2, lane_workers=1)
+    yield executor
+    executor.shutdown()
+
+
+def test_constructor():
+    executor = Executor()
+    assert executor.max_workers == 4
+    assert executor.lane_workers is None
+
+
+def test_lane_size_follows_connection_channels():
+    executor = Executor()
+    cluster = make_cluster('cluster')
+    cluster.connection.max_channels = 3
+
+    lane = executor.get_lane(cluster.label, cluster.connection.max_channels)
+    assert lane._max_workers == 3
+    executor.shutdown()
+
+
+def test_run_off_loop(executor: Executor):
+    async def main():
+        return await executor.run(threading.get_ident)
+
+    assert asyncio.run(main()) != threading.get_ident()
+
+
+def test_lanes_are_per_cluster(executor: Executor):
+    first = make_cluster('first')
+    second = make_cluster('second')
+
+    async def main():
+        return await asyncio.gather(
+            executor.run_on_cluster(first, threading.get_ident),
+            executor.run_on_cluster(first, threading.get_ident),
+            executor.run_on_cluster(second, threading.get_ident),
+        )
+
+    first_a, first_b, second_a = asyncio.run(main())
+    assert first_a == first_b
+    assert first_a != second_a
+
+
+def test_slow_lane_does_not_block_others(executor: Executor):
+    slow = make_cluster('slow')
+    fast = make_cluster('fast')
+    release = threading.Event()
+
+    async def main():
+        blocked = asyncio.ensure_future(
+            executor.run_on_cluster(slow, release.wait, 5))
+        result = await executor.run_on_cluster(fast, lambda: 'done')
+        release.set()
+        await blocked
+        return result
+
+    assert asyncio.run(main()) == 'done'
+
+
+def test_run_db_collects_stats(executor: Executor):
+    async def main():
+        return await asyncio.gather(*[
+            executor.run_db('ident', threading.get_ident) for _ in range(5)
+        ])
+
+    idents = asyncio.run(main())
+    assert len(set(idents)) == 1
+    assert idents[0] != threading.get_ident()
+
+    stats = executor.get_db_stats()['ident']
+    assert stats.count == 5
+    assert stats.max <= stats.total
+
+
+def test_run_db_queue_is_bounded():
+    executor = Executor(db_workers=1, db_queue_size=1)
+    release = threading.Event()
+    running = 0
+    peak = 0
+
+    def query():
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        release.wait(5)
+        running -= 1
+
+    async def main():
+        tasks = [
+            asyncio.ensure_future(executor.run_db('query', query))
+            for _ in range(4)
+        ]
+        await asyncio.sleep(0.1)
+        # One query runs, one waits in the pool, others in the event loop
+        assert executor.get_db_slots().locked()
+        release.set()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    assert peak == 1
+    assert executor.get_db_stats()['query'].count == 4
+    executor.shutdown()
@@ -0,0 +1,135 @@
+from datetime import datetime
+
+import pytest
+
+from HPC_bot.hpc import manager
+from HPC_bot.models import Calculation
+
+
+class StubCluster:
+
+    def __init__(self, outputs):
+        self.label = 'test'
+        self.outputs = list(outputs)
+        self.commands = []
+
+    def start_runner(self, runner, args=None, filename=None, chdir=None):
+        self.commands.append(runner.create_command(args, filename))
+        return self.outputs.pop(0)
+
+    def perform_commands(self, commands):
+        self.commands.extend(commands)
+        return self.outputs.pop(0)
+
+
+def test_parse_squeue():
+    assert manager.parse_squeue(
+        '12 R 1:00:00\n13 PD 2-00:00:00\n14_0 R 59:59\n'
+        '14_1 PD UNLIMITED\n14_[2-5] PD 5\n\nbad line\n'
+    ) == {
+        (12, None): ('R', 3600),
+        (13, None): ('PD', 2 * 86400),
+        (14, 0): ('R', 3599),
+        (14, 1): ('PD', None),
+    }
+
+
+def test_parse_slurm_time():
+    assert manager.parse_slurm_time('5') == 300
+    assert manager.parse_slurm_time('1-02:03:04') == 93784
+    assert manager.parse_slurm_time('NOT_SET') is None
+    assert manager.parse_slurm_time('INVALID') is None
+
+
+def test_poll_slurm_asks_only_tracked_ids(monkeypatch):
+    monkeypatch.setattr(manager, 'SQUEUE_CHUNK_SIZE', 2)
+    cluster = StubCluster([('1 R 10\n2 PD 10\n', ''), ('3 CG 0\n', '')])
+
+    states = manager.poll_slurm(cluster, [1, 2, 3])
+
+    assert {key: state for key, (state, _) in states.items()} == \
+        {(1, None): 'R', (2, None): 'PD', (3, None): 'CG'}
+    assert cluster.commands == [
+        'squeue -h -r -o "%i %t %L" -j 1,2',
+        'squeue -h -r -o "%i %t %L" -j 3',
+    ]
+
+
+def test_poll_slurm_purged_jobs():
+    cluster = StubCluster([
+        ('', 'slurm_load_jobs error: Invalid job id specified')
+    ])
+    assert manager.poll_slurm(cluster, [1]) == {}
+
+
+def test_poll_slurm_fails_loudly():
+    cluster = StubCluster([('', 'slurm_load_jobs error: Socket timed out')])
+    with pytest.raises(RuntimeError):
+        manager.poll_slurm(cluster, [1])
+
+
+def test_parse_memory():
+    assert manager.parse_memory('') is None
+    assert manager.parse_memory('2048') == 2048
+    assert manager.parse_memory('1024K') == 1024 ** 2
+    assert manager.parse_memory('1.5G') == 3 * 1024 ** 3 // 2
+
+
+def test_parse_sacct():
+    jobs = manager.parse_sacct(
+        '12|COMPLETED|0:0|60|240|\n'
+        '12.batch|COMPLETED|0:0|60|240|1024K\n'
+        '12.0|COMPLETED|0:0|55|220|4M\n'
+        '13|CANCELLED by 1000|0:15|5|20|\n'
+        '14_0|COMPLETED|0:0|10|10|\n'
+        '14_0.batch|COMPLETED|0:0|10|10|2M\n'
+        '14_[1-3]|PENDING|0:0|0|0|\n'
+    )
+
+    assert set(jobs) == {(12, None), (13, None), (14, 0)}
+    assert jobs[12, None] == {
+        'slurm_state': 'COMPLETED',
+        'exit_code': '0:0',
+        'elapsed': 60,
+        'cpu_time': 240,
+        'max_rss': 4 * 1024 ** 2,
+    }
+    assert jobs[13, None]['slurm_state'] == 'CANCELLED'
+    assert jobs[13, None]['max_rss'] is None
+    assert jobs[14, 0]['max_rss'] == 2 * 1024 ** 2
+
+
+def test_poll_sacct():
+    cluster = StubCluster([('12|TIMEOUT|0:1|3600|14400|\n', '')])
+
+    jobs = manager.poll_sacct(cluster, [12])
+
+    assert manager.SACCT_STATES[jobs[12, None]['slurm_state']] == \
+        manager.CalculationStatus.TIMEOUT
+    assert cluster.commands == [
+        f'sacct -n -P -o {manager.SACCT_FIELDS} -j 12'
+    ]
+
+
+def test_start_batch():
+    cluster = StubCluster([[
+        'Submitted batch job 21\n',
+        None,
+        'sbatch: error: invalid partition\n',
+    ]])
+    cluster.upload_path = 'uploads'
+    calculations = [
+        Calculation(
+            id=i,
+            name=f'input_{i}.inp',
+            command='sbatch run',
+            start_datetime=datetime(2023, 1, 1),
+            user=1
+        )
+        for i in range(3)
+    ]
+
+    assert manager.start_batch(calculations, cluster) == [21, None, None]
+    assert len(cluster.commands) == 3
+    assert cluster.commands[0][1] == 'input_0.inp'
+    assert cluster.commands[0][2].startswith('uploads/')
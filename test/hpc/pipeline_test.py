@@ -0,0 +1,71 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from HPC_bot.hpc import pipeline
+from HPC_bot.hpc.pipeline import JobQueue, get_queue, submit
+from HPC_bot.models import Calculation, CalculationStatus
+
+
+def make_calculation(id: int, status: CalculationStatus) -> Calculation:
+    return Calculation(
+        id=id,
+        name='test.inp',
+        start_datetime=datetime.utcnow(),
+        status=status.value
+    )
+
+
+@pytest.fixture(autouse=True)
+def clear_queues():
+    pipeline.queues.clear()
+
+
+def test_get_by_status():
+    queue = JobQueue()
+    queue.put(
+        make_calculation(1, CalculationStatus.NOT_STARTED),
+        make_calculation(2, CalculationStatus.PENDING),
+        make_calculation(3, CalculationStatus.RUNNING),
+    )
+
+    assert [c.id for c in queue.get(CalculationStatus.NOT_STARTED)] == [1]
+    assert [c.id for c in queue.get(
+        CalculationStatus.PENDING, CalculationStatus.RUNNING)] == [2, 3]
+
+
+def test_put_replaces_same_calculation():
+    queue = JobQueue()
+    queue.put(make_calculation(1, CalculationStatus.NOT_STARTED))
+    queue.put(make_calculation(1, CalculationStatus.UPLOADED))
+
+    assert len(queue) == 1
+    assert queue.get(CalculationStatus.NOT_STARTED) == []
+
+
+def test_remove():
+    queue = JobQueue()
+    calculation = make_calculation(1, CalculationStatus.LOADED)
+    queue.put(calculation)
+    queue.remove(calculation)
+
+    assert len(queue) == 0
+
+
+def test_wait_times_out():
+    queue = JobQueue()
+    assert not asyncio.run(queue.wait(0))
+
+
+def test_submit_wakes_waiting_worker():
+    queue = get_queue('cluster')
+
+    async def main():
+        waiter = asyncio.ensure_future(queue.wait(3600))
+        await asyncio.sleep(0)
+        submit(make_calculation(1, CalculationStatus.NOT_STARTED), 'cluster')
+        return await waiter
+
+    assert asyncio.run(main())
+    assert len(queue.get(CalculationStatus.NOT_STARTED)) == 1
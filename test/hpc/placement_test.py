@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta
+
+from HPC_bot.hpc import Cluster, Connection, Placement
+from HPC_bot.hpc.placement import LoadSnapshot, get_load, parse_free_nodes
+
+
+def make_cluster(label: str) -> Cluster:
+    return Cluster(
+        label=label,
+        connection=Connection(host='localhost', port=22, user='test'),
+        upload_path='.'
+    )
+
+
+class StubCluster:
+
+    def __init__(self, outputs):
+        self.outputs = list(outputs)
+
+    def start_runner(self, runner, args=None, filename=None, chdir=None):
+        return self.outputs.pop(0)
+
+
+def test_parse_free_nodes():
+    assert parse_free_nodes(
+        '4 idle\n2 mix\n3 alloc\n1 idle*\n5 idle~\n1 down\n') == 11
+
+
+def test_get_load():
+    cluster = StubCluster([('2 idle\n1 alloc\n', ''), ('10\n11\n12\n', '')])
+    snapshot = get_load(cluster)
+
+    assert snapshot.free_nodes == 2
+    assert snapshot.pending_jobs == 3
+
+
+def test_rank_by_load():
+    placement = Placement()
+    busy, idle, unknown = [
+        make_cluster(label) for label in ['busy', 'idle', 'new']]
+
+    placement.update('busy', LoadSnapshot(free_nodes=0, pending_jobs=20))
+    placement.update('idle', LoadSnapshot(free_nodes=4, pending_jobs=2))
+
+    assert placement.rank([unknown, busy, idle]) == [idle, busy, unknown]
+
+
+def test_rank_weights():
+    placement = Placement(free_nodes_weight=10)
+    a, b = make_cluster('a'), make_cluster('b')
+
+    placement.update('a', LoadSnapshot(free_nodes=0, pending_jobs=5))
+    placement.update('b', LoadSnapshot(free_nodes=1, pending_jobs=10))
+
+    assert placement.rank([a, b]) == [b, a]
+
+
+def test_stale_snapshots_keep_config_order():
+    placement = Placement(stale_time=60)
+    a, b = make_cluster('a'), make_cluster('b')
+
+    old = datetime.utcnow() - timedelta(seconds=120)
+    placement.update('b', LoadSnapshot(
+        free_nodes=100, pending_jobs=0, time=old))
+
+    assert placement.rank([a, b]) == [a, b]
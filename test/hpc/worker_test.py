@@ -0,0 +1,293 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from HPC_bot.hpc import Cluster, Connection, pipeline, worker as worker_module
+from HPC_bot.hpc.worker import ClusterWorker, HandoffWorker, Worker
+from HPC_bot.hpc.worker import supervise
+from HPC_bot.models import Calculation, CalculationStatus
+from HPC_bot.utils import config
+
+
+@pytest.fixture(autouse=True)
+def clear_queues():
+    pipeline.queues.clear()
+
+
+class FailingWorker(Worker):
+
+    def __init__(self, failures: int):
+        super().__init__('failing', fetch_time=0, backoff_time=(0, 0))
+        self.remaining = failures
+        self.sweeps = 0
+
+    async def sweep(self):
+        self.sweeps += 1
+        if self.remaining > 0:
+            self.remaining -= 1
+            raise ConnectionError('Failed to connect to server')
+
+
+class CrashingWorker(Worker):
+
+    def __init__(self):
+        super().__init__('crashing', fetch_time=0, backoff_time=(0, 0))
+        self.runs = 0
+
+    async def sweep(self):
+        pass
+
+    async def run(self):
+        self.runs += 1
+        if self.runs == 1:
+            raise RuntimeError('Worker crashed')
+        await asyncio.sleep(3600)
+
+
+class IdleWorker(Worker):
+
+    async def sweep(self):
+        pass
+
+
+def test_worker_is_abstract():
+    with pytest.raises(TypeError):
+        Worker('test')
+
+
+def test_fetch_time_without_failures():
+    worker = IdleWorker('test', fetch_time=10, backoff_time=(30, 1800))
+    assert worker.get_delay() == 10
+
+
+def test_backoff_grows_with_failures():
+    worker = IdleWorker('test', fetch_time=10, backoff_time=(30, 1800))
+
+    worker.failures = 1
+    assert 15 <= worker.get_delay() <= 30
+
+    worker.failures = 3
+    assert 60 <= worker.get_delay() <= 120
+
+    worker.failures = 20
+    assert 900 <= worker.get_delay() <= 1800
+
+
+def test_failures_reset_after_success():
+    worker = FailingWorker(failures=2)
+
+    async def main():
+        task = asyncio.ensure_future(worker.run())
+        while worker.sweeps < 4:
+            await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    assert worker.failures == 0
+    assert worker.last_error is not None
+
+
+def test_supervisor_restarts_crashed_worker():
+    crashing = CrashingWorker()
+    failing = FailingWorker(failures=0)
+
+    async def main():
+        task = asyncio.ensure_future(supervise([crashing, failing]))
+        while crashing.runs < 2 or failing.sweeps < 2:
+            await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    assert crashing.runs == 2
+    assert crashing.failures == 1
+    assert crashing.last_error is not None
+
+
+class StubCalculation:
+
+    def __init__(self, id: int, status: CalculationStatus):
+        self.id = id
+        self.status = status
+
+    def get_status(self) -> CalculationStatus:
+        return self.status
+
+
+def make_cluster(**kwargs) -> Cluster:
+    return Cluster(
+        label='test',
+        connection=Connection(host='localhost', port=22, user='test'),
+        upload_path='.',
+        fetch_time=3600,
+        **kwargs
+    )
+
+
+def test_sync_requires_sftp_mode():
+    with pytest.raises(ValueError):
+        make_cluster(sync_time=600, transfer_mode='tar')
+
+
+def stub_stages(monkeypatch) -> dict:
+    calls = {'sync': [], 'check': 0, 'started': [], 'time_left': None}
+
+    async def stage(cluster, calculations):
+        return []
+
+    async def start(cluster, calculations):
+        return calls['started']
+
+    async def check(cluster, calculations):
+        calls['check'] += 1
+        return [], calls['time_left']
+
+    async def sync(cluster, calculations):
+        calls['sync'].append(calculations)
+        return calculations
+
+    for name in [
+        'upload_calculations',
+        'load_finished',
+    ]:
+        monkeypatch.setattr(worker_module, name, stage)
+    monkeypatch.setattr(worker_module, 'start_calculations', start)
+    monkeypatch.setattr(worker_module, 'check_updates', check)
+    monkeypatch.setattr(worker_module, 'sync_running', sync)
+    return calls
+
+
+def test_cluster_worker_syncs_running(monkeypatch):
+    calls = stub_stages(monkeypatch)
+    running = StubCalculation(1, CalculationStatus.RUNNING)
+    pending = StubCalculation(2, CalculationStatus.PENDING)
+
+    worker = ClusterWorker(make_cluster(sync_time=600))
+    worker.queue.put(running, pending)
+
+    asyncio.run(worker.sweep())
+    asyncio.run(worker.sweep())
+
+    assert calls['sync'] == [[running]]
+    assert 0 < worker.get_delay() <= 600
+
+
+def test_cluster_worker_sync_disabled(monkeypatch):
+    calls = stub_stages(monkeypatch)
+
+    worker = ClusterWorker(make_cluster())
+    worker.queue.put(StubCalculation(1, CalculationStatus.RUNNING))
+    asyncio.run(worker.sweep())
+
+    assert calls['sync'] == []
+    assert worker.get_delay() > 600
+
+
+def test_cluster_worker_polls_rarely_when_idle(monkeypatch):
+    calls = stub_stages(monkeypatch)
+    monkeypatch.setattr(config, 'idle_fetch_time', 900)
+
+    worker = ClusterWorker(make_cluster())
+    asyncio.run(worker.sweep())
+
+    assert calls['check'] == 1
+    assert 800 < worker.get_delay() <= 900
+
+
+def test_cluster_worker_polls_fast_after_submission(monkeypatch):
+    calls = stub_stages(monkeypatch)
+    monkeypatch.setattr(config, 'fast_fetch_time', 30)
+
+    pending = StubCalculation(1, CalculationStatus.PENDING)
+    calls['started'] = [pending]
+    worker = ClusterWorker(make_cluster())
+    worker.next_poll = datetime.utcnow() + timedelta(hours=1)
+    worker.queue.put(pending)
+
+    asyncio.run(worker.sweep())
+    assert calls['check'] == 0
+    assert 0 < worker.get_delay() <= 30
+
+    calls['started'] = []
+    worker.next_poll = datetime.utcnow()
+    asyncio.run(worker.sweep())
+    assert calls['check'] == 1
+    assert 0 < worker.get_delay() <= 30
+
+
+def test_cluster_worker_polls_after_expected_finish(monkeypatch):
+    calls = stub_stages(monkeypatch)
+    monkeypatch.setattr(config, 'fast_fetch_time', 30)
+    calls['time_left'] = 100
+
+    worker = ClusterWorker(make_cluster())
+    worker.queue.put(StubCalculation(1, CalculationStatus.RUNNING))
+    asyncio.run(worker.sweep())
+
+    assert 100 < worker.get_delay() <= 130
+
+
+def test_cluster_worker_reconcile_skips_empty_statuses(monkeypatch):
+    loaded = []
+
+    def get_by_statuses(statuses, cluster_label=None):
+        loaded.append(statuses)
+        return []
+
+    monkeypatch.setattr(Calculation, 'count_by_status', staticmethod(
+        lambda cluster_label=None: {}))
+    monkeypatch.setattr(
+        Calculation, 'get_by_statuses', staticmethod(get_by_statuses))
+
+    worker = ClusterWorker(make_cluster())
+    asyncio.run(worker.reconcile())
+    assert loaded == []
+
+    monkeypatch.setattr(Calculation, 'count_by_status', staticmethod(
+        lambda cluster_label=None: {
+            ('test', CalculationStatus.RUNNING): 2,
+            ('test', CalculationStatus.TIMEOUT): 1,
+            ('test', CalculationStatus.SENDED): 10,
+        }))
+    asyncio.run(worker.reconcile())
+    assert loaded == [
+        [CalculationStatus.RUNNING, CalculationStatus.TIMEOUT]]
+
+
+def test_handoff_worker_takes_new_calculations(monkeypatch):
+    loaded = []
+    saved = [
+        StubCalculation(1, CalculationStatus.NOT_STARTED),
+        StubCalculation(2, CalculationStatus.UPLOADED),
+    ]
+
+    def get_by_statuses(statuses, cluster_label=None):
+        loaded.append(cluster_label)
+        return [StubCalculation(c.id, c.status) for c in saved]
+
+    monkeypatch.setattr(Calculation, 'count_by_status', staticmethod(
+        lambda cluster_label=None: {
+            ('test', CalculationStatus.NOT_STARTED): 1,
+            ('test', CalculationStatus.UPLOADED): 1,
+            ('test', CalculationStatus.RUNNING): 5,
+            ('other', CalculationStatus.NOT_STARTED): 3,
+        }))
+    monkeypatch.setattr(
+        Calculation, 'get_by_statuses', staticmethod(get_by_statuses))
+
+    queue = pipeline.get_queue('test')
+    queue.put(saved[0])
+    worker = HandoffWorker([make_cluster()], 10)
+    asyncio.run(worker.sweep())
+
+    # Calculations already in the queue are kept as they are
+    assert loaded == ['test']
+    assert queue.get(CalculationStatus.NOT_STARTED) == [saved[0]]
+    assert [c.id for c in queue.get(CalculationStatus.UPLOADED)] == [2]
+
+    asyncio.run(worker.sweep())
+    assert loaded == ['test']
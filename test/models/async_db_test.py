@@ -0,0 +1,65 @@
+import asyncio
+import pytest
+from peewee import SqliteDatabase
+
+from HPC_bot.models import Organization, Person, User, TelegramUser
+from HPC_bot.models import async_db
+from HPC_bot.utils import config
+
+MODELS = [Organization, Person, User, TelegramUser]
+
+
+@pytest.fixture
+def database(tmp_path):
+    # Queries run in another thread, in-memory database is per connection
+    test_db = SqliteDatabase(str(tmp_path / 'test.db'))
+    config.bot.auth_cache.clear()
+    with test_db.bind_ctx(MODELS):
+        test_db.create_tables(MODELS)
+        yield test_db
+    config.executor.shutdown()
+
+
+def test_authenticate(database):
+    async def main():
+        await async_db.register(1, 'Test', 'User')
+        return (
+            await async_db.authenticate(1, apply_join=True),
+            await async_db.authenticate(2, no_throw=True),
+        )
+
+    tg_user, unknown = asyncio.run(main())
+    assert tg_user.user.person.first_name == 'Test'
+    assert unknown is None
+    assert config.executor.get_db_stats()['authenticate'].count >= 2
+
+
+def test_approve_user_returns_joined_tg_user(database):
+    tg_user = TelegramUser.register(1, 'Test', 'User')
+
+    async def main():
+        return (
+            await async_db.approve_user(tg_user.user.id),
+            await async_db.approve_user(tg_user.user.id),
+        )
+
+    approved, repeated = asyncio.run(main())
+    assert approved.tg_id == 1
+    assert approved.user.person.approved
+    assert repeated is None
+
+
+def test_authentication_is_cached_until_block(database):
+    tg_user = TelegramUser.register(1, 'Test', 'User')
+
+    async def main():
+        first = await async_db.authenticate(1, apply_join=True)
+        second = await async_db.authenticate(1, apply_join=True)
+        await async_db.block_user(tg_user.user.id)
+        third = await async_db.authenticate(1, apply_join=True)
+        return first, second, third
+
+    first, second, third = asyncio.run(main())
+    assert first is second
+    assert not second.user.blocked
+    assert third.user.blocked
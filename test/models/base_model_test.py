@@ -0,0 +1,50 @@
+from playhouse.pool import PooledSqliteDatabase
+
+from HPC_bot.hpc import Database, DatabaseTypes
+from HPC_bot.models import connection_scope
+from HPC_bot.models.base_model import create_database
+from HPC_bot.models.base_model import ReconnectPooledPostgresqlDatabase
+from HPC_bot.models.base_model import ReconnectPostgresqlDatabase
+
+
+def test_create_database():
+    settings = Database(name='test', db_type=DatabaseTypes.POSTGRESQL)
+    database = create_database(settings)
+    assert isinstance(database, ReconnectPooledPostgresqlDatabase)
+    assert database._max_connections == settings.max_connections
+
+    settings.pooled = False
+    assert isinstance(
+        create_database(settings), ReconnectPostgresqlDatabase)
+
+
+def test_sqlite_pragmas(tmp_path):
+    database = create_database(Database(name=str(tmp_path / 'test.db')))
+    assert database.execute_sql(
+        'PRAGMA journal_mode').fetchone()[0] == 'wal'
+
+    # Connection of unpooled database is kept
+    with connection_scope(database):
+        database.execute_sql('SELECT 1')
+    assert not database.is_closed()
+
+
+def test_connection_scope(tmp_path):
+    database = PooledSqliteDatabase(str(tmp_path / 'test.db'))
+
+    with connection_scope(database):
+        with connection_scope(database):
+            database.execute_sql('SELECT 1')
+        assert not database.is_closed()
+    assert database.is_closed()
+    assert len(database._connections) == 1
+
+    # Overlapping scopes of concurrent handlers
+    first, second = connection_scope(database), connection_scope(database)
+    first.__enter__()
+    second.__enter__()
+    database.execute_sql('SELECT 1')
+    first.__exit__(None, None, None)
+    assert not database.is_closed()
+    second.__exit__(None, None, None)
+    assert database.is_closed()
@@ -1,8 +1,14 @@
-from datetime import datetime
+from datetime import datetime, timedelta
+from types import SimpleNamespace
 import pytest
+from peewee import SqliteDatabase
 
-from HPC_bot.models import Calculation, User
-from HPC_bot.models import CalculationStatus
+from HPC_bot.models import Calculation, Cluster, Organization, Person, User
+from HPC_bot.models import CalculationStatus, SubmitType
+from HPC_bot.models import CalculationLimitExceeded
+from HPC_bot.utils import get_month_start
+
+MODELS = [Organization, Person, User, Cluster, Calculation]
 
 
 @pytest.fixture
@@ -30,3 +36,142 @@ def finished_calculation():
 
 def test_calc_ge(pending_calculation, finished_calculation):
     assert finished_calculation.status >= pending_calculation.status
+
+
+def test_from_slurm():
+    assert CalculationStatus.from_slurm('PD') == CalculationStatus.PENDING
+    assert CalculationStatus.from_slurm('CF') == CalculationStatus.PENDING
+    assert CalculationStatus.from_slurm('CG') == CalculationStatus.RUNNING
+    assert CalculationStatus.from_slurm('S') == CalculationStatus.RUNNING
+    assert CalculationStatus.from_slurm('F') == CalculationStatus.FAILED
+    assert CalculationStatus.from_slurm('TO') == CalculationStatus.TIMEOUT
+    assert CalculationStatus.from_slurm('CA') == CalculationStatus.CANCELLED
+    assert CalculationStatus.from_slurm('??') is None
+
+
+def test_finished_statuses_are_not_unfinished():
+    for status in CalculationStatus.get_finished():
+        assert status.is_finished()
+        assert status >= CalculationStatus.FINISHED_OK
+        assert status < CalculationStatus.FAILED_TO_UPLOAD
+    assert not CalculationStatus.RUNNING.is_finished()
+
+
+@pytest.fixture
+def database():
+    test_db = SqliteDatabase(':memory:')
+    with test_db.bind_ctx(MODELS):
+        test_db.create_tables(MODELS)
+        yield test_db
+
+
+def create_calculations(statuses, label: str):
+    person = Person.create(first_name='Test', last_name='Test')
+    user = User.create(calculation_limit=100, person=person)
+    cluster, _ = Cluster.get_or_create(label=label, defaults={'name': label})
+    for status in statuses:
+        Calculation.create(
+            name='test.inp',
+            command='sbatch run.sh',
+            start_datetime=datetime.utcnow(),
+            status=status.value,
+            submit_type=SubmitType.TELEGRAM.value,
+            user=user,
+            cluster=cluster
+        )
+
+
+def test_count_by_status(database):
+    create_calculations([
+        CalculationStatus.RUNNING,
+        CalculationStatus.RUNNING,
+        CalculationStatus.LOADED,
+    ], 'first')
+    create_calculations([CalculationStatus.RUNNING], 'second')
+
+    assert Calculation.count_by_status() == {
+        ('first', CalculationStatus.RUNNING): 2,
+        ('first', CalculationStatus.LOADED): 1,
+        ('second', CalculationStatus.RUNNING): 1,
+    }
+    assert Calculation.count_by_status('second') == {
+        ('second', CalculationStatus.RUNNING): 1,
+    }
+
+
+def test_get_by_statuses(database):
+    create_calculations([
+        CalculationStatus.PENDING,
+        CalculationStatus.RUNNING,
+        CalculationStatus.LOADED,
+    ], 'first')
+
+    calculations = Calculation.get_by_statuses([
+        CalculationStatus.PENDING,
+        CalculationStatus.LOADED,
+    ], 'first')
+    assert sorted(c.get_status().value for c in calculations) == [
+        CalculationStatus.PENDING.value,
+        CalculationStatus.LOADED.value,
+    ]
+    assert len(Calculation.get_by_statuses(
+        [CalculationStatus.PENDING], 'second')) == 0
+
+
+def submit(user: User) -> Calculation:
+    return Calculation.new_calculation(
+        'test.inp',
+        'sbatch run.sh',
+        user,
+        SubmitType.TELEGRAM,
+        SimpleNamespace(label='first')
+    )
+
+
+def test_calculation_limit(database):
+    person = Person.create(first_name='Test', last_name='Test')
+    user = User.create(calculation_limit=2, person=person)
+
+    submit(user)
+    submit(user)
+    with pytest.raises(CalculationLimitExceeded):
+        submit(user)
+
+    assert user.count_calculations(get_month_start()) == 2
+
+
+def test_limit_counts_existing_calculations(database):
+    create_calculations([CalculationStatus.RUNNING] * 3, 'first')
+    user = User.get()
+    user.calculation_limit = 4
+    user.save()
+
+    submit(user)
+    with pytest.raises(CalculationLimitExceeded):
+        submit(user)
+
+
+def shift_calculations(days: int):
+    for calculation in Calculation.select():
+        calculation.start_datetime -= timedelta(days=days)
+        calculation.save()
+
+
+def test_limit_holds_across_days(database):
+    person = Person.create(first_name='Test', last_name='Test')
+    user = User.create(calculation_limit=2, person=person)
+
+    # The window is rolling 30 days, not a counter reset each day
+    for _ in range(5):
+        for _ in range(3):
+            try:
+                submit(user)
+            except CalculationLimitExceeded:
+                pass
+        shift_calculations(1)
+
+    assert user.count_calculations() == 2
+
+    shift_calculations(30)
+    submit(user)
+    assert user.count_calculations(get_month_start()) == 1
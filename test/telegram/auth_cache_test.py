@@ -0,0 +1,64 @@
+from types import SimpleNamespace
+
+from HPC_bot.telegram.auth_cache import AuthCache
+
+
+def make_tg_user(tg_id: int, user_id: int, person_id: int):
+    return SimpleNamespace(
+        tg_id=tg_id,
+        user_id=user_id,
+        user=SimpleNamespace(id=user_id, person_id=person_id)
+    )
+
+
+def test_hits_and_misses():
+    cache = AuthCache()
+    tg_user = make_tg_user(1, 10, 100)
+
+    assert cache.get(1) is None
+    cache.put(1, tg_user)
+    assert cache.get(1) is tg_user
+
+    stats = cache.get_stats()
+    assert (stats.hits, stats.misses, stats.size) == (1, 1, 1)
+    assert stats.get_hit_rate() == 0.5
+
+
+def test_expiration(monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr('time.monotonic', lambda: now)
+    cache = AuthCache(ttl=10)
+    cache.put(1, make_tg_user(1, 10, 100))
+
+    now += 11
+    assert cache.get(1) is None
+    assert cache.get_stats().size == 0
+
+
+def test_lru_eviction():
+    cache = AuthCache(size=2)
+    for i in range(2):
+        cache.put(i, make_tg_user(i, i, i))
+    cache.get(0)
+    cache.put(2, make_tg_user(2, 2, 2))
+
+    assert cache.get(1) is None
+    assert cache.get(0) is not None
+    assert cache.get_stats().evictions == 1
+
+
+def test_invalidate():
+    cache = AuthCache()
+    for i in range(3):
+        cache.put(i, make_tg_user(i, 10 + i, 100 + i))
+
+    cache.invalidate(tg_id=0)
+    cache.invalidate(user_id=11)
+    cache.invalidate(person_id=102)
+    assert cache.get_stats().size == 0
+
+
+def test_disabled():
+    cache = AuthCache(size=0)
+    cache.put(1, make_tg_user(1, 10, 100))
+    assert cache.get(1) is None
@@ -0,0 +1,125 @@
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+import pytest
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMessage
+from peewee import SqliteDatabase
+
+from HPC_bot.models import Calculation, Cluster, Organization, Person, User
+from HPC_bot.models import TelegramUser
+from HPC_bot.models import CalculationStatus, SubmitType
+from HPC_bot.telegram.manager import notify_on_finished
+from HPC_bot.telegram.outbox import outbox
+from HPC_bot.utils import config
+
+MODELS = [Organization, Person, User, TelegramUser, Cluster, Calculation]
+
+
+class FakeBot:
+    def __init__(self):
+        self.messages = []
+        self.throttled = False
+
+    async def send_message(self, chat_id: int, text: str):
+        if not self.throttled:
+            self.throttled = True
+            raise TelegramRetryAfter(
+                SendMessage(chat_id=chat_id, text=text), 'Flood', 0)
+        self.messages.append((chat_id, text))
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'storage', SimpleNamespace(
+        get_shared=lambda folder: f'https://cloud/{folder}'))
+    monkeypatch.setattr(config.bot, 'log_chat_id', None)
+    monkeypatch.setattr(config.bot, 'messages_per_second', 1000)
+    monkeypatch.setattr(config.bot, 'chat_messages_per_second', 1000)
+
+    test_db = SqliteDatabase(str(tmp_path / 'test.db'))
+    with test_db.bind_ctx(MODELS):
+        test_db.create_tables(MODELS)
+        yield test_db
+    config.executor.shutdown()
+
+
+def create_calculations(count: int, status: CalculationStatus):
+    cluster, _ = Cluster.get_or_create(label='first', defaults={
+        'name': 'first'})
+    for i in range(count):
+        tg_user = TelegramUser.register(i + 1, 'Test', str(i))
+        Calculation.create(
+            name=f'test_{i}.inp',
+            command='sbatch run.sh',
+            start_datetime=datetime.utcnow(),
+            status=status.value,
+            submit_type=SubmitType.TELEGRAM.value,
+            user=tg_user.user,
+            cluster=cluster
+        )
+
+
+def notify(bot: FakeBot):
+    async def main():
+        outbox.start(bot)
+        await notify_on_finished(bot)
+        await outbox.stop()
+
+    asyncio.run(main())
+
+
+def test_notify_on_finished(database):
+    create_calculations(50, CalculationStatus.CLOUDED)
+    bot = FakeBot()
+
+    notify(bot)
+
+    assert len(bot.messages) == 50
+    assert sorted(chat_id for chat_id, _ in bot.messages) == list(
+        range(1, 51))
+    assert all('https://cloud/' in text for _, text in bot.messages)
+    assert Calculation.select().where(
+        Calculation.status == CalculationStatus.SENDED.value).count() == 50
+
+
+def test_failed_link_is_retried_later(database, monkeypatch):
+    create_calculations(2, CalculationStatus.CLOUDED)
+
+    def get_shared(folder: str) -> str:
+        if folder.endswith('test_0'):
+            raise IOError('Storage is unavailable')
+        return f'https://cloud/{folder}'
+
+    monkeypatch.setattr(config.storage, 'get_shared', get_shared)
+    bot = FakeBot()
+    bot.throttled = True
+    notify(bot)
+
+    assert len(bot.messages) == 1
+    assert Calculation.get(
+        Calculation.name == 'test_0.inp'
+    ).get_status() == CalculationStatus.CLOUDED
+
+
+def test_undelivered_notification_is_retried_later(database):
+    create_calculations(2, CalculationStatus.CLOUDED)
+    bot = FakeBot()
+    bot.throttled = True
+    sent = bot.send_message
+
+    async def send_message(chat_id: int, text: str):
+        if chat_id == 1:
+            raise ConnectionError('Telegram is unavailable')
+        await sent(chat_id, text)
+
+    bot.send_message = send_message
+    notify(bot)
+
+    assert [chat_id for chat_id, _ in bot.messages] == [2]
+    assert Calculation.get(
+        Calculation.name == 'test_0.inp'
+    ).get_status() == CalculationStatus.CLOUDED
+    assert Calculation.get(
+        Calculation.name == 'test_1.inp'
+    ).get_status() == CalculationStatus.SENDED
@@ -0,0 +1,84 @@
+import asyncio
+import pytest
+
+from HPC_bot.telegram.outbox import Outbox, split_digest, MESSAGE_LENGTH
+from HPC_bot.utils import config
+
+
+class FakeBot:
+    def __init__(self):
+        self.messages = []
+        self.documents = []
+
+    async def send_message(self, chat_id, text: str):
+        self.messages.append((chat_id, text))
+
+    async def send_document(self, chat_id, document: str, caption: str):
+        self.documents.append((chat_id, document, caption))
+
+
+@pytest.fixture
+def log_chat(monkeypatch):
+    monkeypatch.setattr(config.bot, 'log_chat_id', -100)
+    monkeypatch.setattr(config.bot, 'notify_concurrency', 1)
+    monkeypatch.setattr(config.bot, 'log_digest_time', 10)
+
+
+def test_user_messages_go_first(log_chat):
+    outbox = Outbox()
+    bot = FakeBot()
+
+    async def main():
+        outbox.log('log', 'file_id')
+        outbox.send(1, 'first')
+        outbox.send(2, 'second')
+        outbox.start(bot)
+        await outbox.stop()
+
+    asyncio.run(main())
+    assert bot.messages == [(1, 'first'), (2, 'second')]
+    assert bot.documents == [(-100, 'file_id', 'log')]
+
+
+def test_log_entries_are_joined(log_chat):
+    outbox = Outbox()
+    bot = FakeBot()
+
+    async def main():
+        outbox.start(bot)
+        for i in range(5):
+            outbox.log(f'event {i}')
+        await asyncio.sleep(0.01)
+        assert bot.messages == []
+        await outbox.stop()
+
+    asyncio.run(main())
+    assert bot.messages == [
+        (-100, '\n\n'.join(f'event {i}' for i in range(5)))]
+
+
+def test_chat_order_is_kept(log_chat, monkeypatch):
+    monkeypatch.setattr(config.bot, 'notify_concurrency', 4)
+    monkeypatch.setattr(config.bot, 'chat_messages_per_second', 1000)
+    outbox = Outbox()
+    bot = FakeBot()
+
+    async def main():
+        outbox.start(bot)
+        for i in range(20):
+            outbox.send(1 + i % 2, str(i))
+        await outbox.stop()
+
+    asyncio.run(main())
+    for chat_id in (1, 2):
+        texts = [int(text) for chat, text in bot.messages if chat == chat_id]
+        assert texts == sorted(texts)
+        assert len(texts) == 10
+
+
+def test_split_digest():
+    entries = ['a' * 3000, 'b' * 3000, 'c' * 10]
+    messages = split_digest(entries)
+    assert messages == ['a' * 3000, 'b' * 3000 + '\n\n' + 'c' * 10]
+    assert all(len(m) <= MESSAGE_LENGTH for m in split_digest(
+        ['d' * 5000]))
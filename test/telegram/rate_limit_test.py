@@ -0,0 +1,24 @@
+import asyncio
+import time
+
+from HPC_bot.telegram.rate_limit import TokenBucket
+
+
+def test_burst_then_rate():
+    bucket = TokenBucket(rate=100, capacity=5)
+
+    async def main():
+        start = time.monotonic()
+        for _ in range(10):
+            await bucket.acquire()
+        return time.monotonic() - start
+
+    # Five tokens are available at once, the rest come at 100 per second
+    assert 0.04 <= asyncio.run(main()) < 0.5
+
+
+def test_delay():
+    bucket = TokenBucket(rate=1, capacity=1)
+    assert bucket.get_delay() == 0
+    bucket.tokens = 0
+    assert 0 < bucket.get_delay() <= 1
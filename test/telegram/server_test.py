@@ -0,0 +1,81 @@
+import asyncio
+from aiogram import Bot, Dispatcher, Router
+from aiogram.types import Message
+from aiohttp.test_utils import TestClient, TestServer
+
+from HPC_bot.telegram.bot import Bot as BotConfig
+from HPC_bot.telegram.middlewares import ConcurrencyMiddleware
+from HPC_bot.telegram.server import SECRET_HEADER, create_app
+from HPC_bot.telegram.server import make_message_update
+from HPC_bot.telegram.webhook import Webhook
+
+
+def test_webhook_dispatches_updates():
+    received = []
+    router = Router()
+
+    @router.message()
+    async def handler(message: Message):
+        received.append((message.from_user.id, message.text))
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    bot = Bot('42:TEST')
+    webhook = Webhook(secret_token='secret', max_concurrency=2)
+
+    async def main():
+        client = TestClient(TestServer(create_app(dp, bot, webhook)))
+        await client.start_server()
+        try:
+            denied = await client.post(
+                webhook.path, json=make_message_update(1, 7, '/help'))
+            accepted = await asyncio.gather(*[
+                client.post(
+                    webhook.path,
+                    json=make_message_update(i, 7, f'/help {i}'),
+                    headers={SECRET_HEADER: 'secret'}
+                )
+                for i in range(2, 6)
+            ])
+            for _ in range(100):
+                if len(received) == 4:
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            await client.close()
+            await bot.session.close()
+        return denied.status, [r.status for r in accepted]
+
+    denied, accepted = asyncio.run(main())
+    assert denied == 401
+    assert accepted == [200] * 4
+    assert sorted(received) == [(7, f'/help {i}') for i in range(2, 6)]
+
+
+def test_concurrency_middleware():
+    middleware = ConcurrencyMiddleware(2)
+    running = 0
+    peak = 0
+
+    async def handler(event, data):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    async def main():
+        await asyncio.gather(*[
+            middleware(handler, None, {}) for _ in range(5)
+        ])
+
+    asyncio.run(main())
+    assert peak == 2
+
+
+def test_shared_instances_shorten_auth_cache():
+    config = BotConfig(webhook=Webhook(run_workers=False))
+    assert config.auth_cache.ttl == config.webhook.shared_cache_ttl
+
+    config = BotConfig(webhook=Webhook())
+    assert config.auth_cache.ttl == 300
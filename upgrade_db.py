@@ -0,0 +1,47 @@
+from playhouse.migrate import SchemaMigrator, make_index_name, migrate
+
+from HPC_bot.models import *
+
+
+# Adds columns introduced after the initial schema, safe to run repeatedly
+COLUMNS = {
+    Calculation: [
+        'array_task_id',
+        'slurm_state',
+        'exit_code',
+        'elapsed',
+        'cpu_time',
+        'max_rss',
+    ],
+}
+# Indexes are taken from Meta.indexes of these models
+INDEXED_MODELS = [Calculation]
+
+db.connect()
+
+migrator = SchemaMigrator.from_database(db)
+operations = []
+
+for model, fields in COLUMNS.items():
+    table = model._meta.table_name
+    existing = {column.name for column in db.get_columns(table)}
+
+    for name in fields:
+        field = model._meta.fields[name]
+        if field.column_name not in existing:
+            operations.append(
+                migrator.add_column(table, field.column_name, field))
+
+for model in INDEXED_MODELS:
+    table = model._meta.table_name
+    existing = {index.name for index in db.get_indexes(table)}
+
+    for fields, unique in model._meta.indexes:
+        columns = [model._meta.fields[name].column_name for name in fields]
+        if make_index_name(table, columns) not in existing:
+            operations.append(migrator.add_index(table, columns, unique))
+
+with db.atomic():
+    migrate(*operations)
+
+db.close()